@@ -2,200 +2,508 @@
 API client for HighLevel integration
 """
 import asyncio
+import copy
+import functools
+import json
+import logging
+import threading
+import time as time_module
 import aiohttp
-import streamlit as st
-from datetime import datetime, timezone, time
-from utils import canonical, pct, pct_str, EXCLUDED_STAGE_CANON
-
-# Connection pooling configuration
-CONNECTOR_LIMIT = 100
-CONNECTOR_LIMIT_PER_HOST = 30
+from contextlib import asynccontextmanager
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone, time
+from urllib.parse import urlencode, urlparse
+from utils import pct, pct_str
+import async_runtime
+import circuit_breaker
+from day_cache import day_cache, result_cache, day_range, missing_span, to_date
+import fetch_jobs
+import opportunity_decode
+import opportunity_store
+from opportunity_batch import OpportunityBatch
+import rate_limiter
+import scheduler
+import single_flight
+import stage_classifier
+
+HIGHLEVEL_API_URL = "https://rest.gohighlevel.com/v1"
 REQUEST_TIMEOUT = 30
+PAGE_CHUNK_SIZE = 64 * 1024  # bytes read at a time when streaming an opportunities page
+PAGE_PIPELINE_DEPTH = 2  # decoded opportunity pages the producer may hold ahead of the consumer
+MAX_THROTTLE_RETRIES = 3
+PIPELINE_CACHE_TTL = 6 * 3600  # pipelines/stages rarely change; see invalidate_pipeline_cache()
 
+# Graph API error codes meaning "throttled" (returned with HTTP 400/403 rather than 429)
+META_THROTTLE_CODES = {4, 17, 32, 613} | set(range(80000, 80015))
 
-async def fetch_all_opportunities(session, url_base, center):
-    """Fetch all opportunities with pagination - optimized"""
-    items = []
+logger = logging.getLogger(__name__)
+
+# locationId -> {'fetched_at', 'pipelines': {pipelineName: metadata}}
+_pipeline_cache = {}
+
+
+# refresh_key -> concurrent.futures.Future of the running refresh
+_refreshes = {}
+_refreshes_lock = threading.Lock()
+
+
+def _refresh_in_background(refresh_key, coro):
+    """
+    Run a cache refresh on the shared runtime without waiting for it (stale-while-revalidate).
+    Only one refresh per refresh_key runs at a time; duplicates are dropped and get the running one.
+    Returns the refresh's future (see Freshness.track).
+    """
+    with _refreshes_lock:
+        running = _refreshes.get(refresh_key)
+        if running is not None:
+            coro.close()
+            return running
+        future = _refreshes[refresh_key] = async_runtime.submit_future(coro)
+
+    def done(finished):
+        with _refreshes_lock:
+            if _refreshes.get(refresh_key) is finished:
+                del _refreshes[refresh_key]
+        if not finished.cancelled() and finished.exception():
+            logger.warning("Background refresh %s failed: %s", refresh_key, finished.exception())
+
+    future.add_done_callback(done)
+    return future
+
+
+def _meta_throttle_code(body):
+    try:
+        code = json.loads(body).get('error', {}).get('code')
+    except (ValueError, AttributeError):
+        return None
+    return code if code in META_THROTTLE_CODES else None
+
+
+def _is_upstream_failure(host, status):
+    """Responses that count against the circuit breaker: auth/account errors and server errors"""
+    return status in (401, 403) or status >= 500 or (host == async_runtime.GRAPH_HOST and status == 400)
+
+
+@asynccontextmanager
+async def _limited_request(session, method, url, limiter_key, **kwargs):
+    """
+    Send a request through the rate limiter of its host and limiter_key (locationId/ad account).
+    Throttled responses (429, Meta throttling codes) pause the limiter for Retry-After (or a
+    backoff) and are retried up to MAX_THROTTLE_RETRIES times; usage headers tune the rate.
+    A slot of the scheduler's host/key concurrency budget is held while a request is in flight.
+    While the host/key circuit breaker is open, raises circuit_breaker.CircuitOpenError at once.
+    Yields the final aiohttp response.
+    """
+    host = urlparse(url).hostname
+    breaker = circuit_breaker.get_breaker(host, limiter_key)
+    breaker.before_request()
+    limiter = rate_limiter.get_limiter(host, limiter_key)
+    budget = scheduler.budget(host, limiter_key)
+
+    try:
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            await limiter.acquire()
+            await budget.acquire()
+            response = await session.request(method, url, **kwargs)
+
+            throttled = response.status == 429
+            if not throttled and host == async_runtime.GRAPH_HOST and response.status in (400, 403):
+                throttled = _meta_throttle_code(await response.text()) is not None
+
+            if host == async_runtime.GRAPH_HOST:
+                usage, regain_seconds = rate_limiter.parse_meta_usage(response.headers)
+                limiter.on_usage(usage, regain_seconds)
+            elif response.headers.get('X-RateLimit-Remaining') == '0':
+                interval_ms = response.headers.get('X-RateLimit-Interval-Milliseconds')
+                limiter.pause(float(interval_ms) / 1000 if interval_ms else rate_limiter.DEFAULT_BACKOFF)
+
+            if not throttled:
+                limiter.on_success()
+                break
+
+            limiter.on_throttle(rate_limiter.parse_retry_after(response.headers.get('Retry-After')))
+            if attempt == MAX_THROTTLE_RETRIES:
+                break
+            response.release()
+            budget.release()
+    except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+        breaker.on_failure(f"{type(e).__name__}: {e}".rstrip(': '))
+        budget.release()
+        raise
+    except BaseException:
+        breaker.on_abandon()
+        budget.release()
+        raise
+
+    if _is_upstream_failure(host, response.status) and not throttled:
+        breaker.on_failure(f"HTTP {response.status}")
+    elif throttled:
+        breaker.on_abandon()
+    else:
+        breaker.on_success()
+
+    try:
+        yield response
+    finally:
+        response.release()
+        budget.release()
+
+
+async def _off_loop(fn, *args):
+    """
+    Run blocking work (SQLite reads/writes, pickling, numpy over a whole pipeline) in an executor
+    thread, so the shared loop keeps serving every session's requests meanwhile
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+
+def _parse_iso(value):
+    """Parse an API ISO-8601 timestamp ('Z' suffix allowed); None when missing or invalid"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _pages_newest_first(items):
+    """
+    Whether a whole pipeline, in the order the API paged it, came most recently updated first:
+    updatedAt never increases, while creation order does somewhere (so it is not createdAt order)
+    """
+    updated = [_parse_iso(o.get('updatedAt')) for o in items]
+    created = [_parse_iso(o.get('createdAt')) for o in items]
+    if None in updated or any(a < b for a, b in zip(updated, updated[1:])):
+        return False
+    return any(a < b for a, b in zip(created, created[1:]) if a and b)
+
+
+def _newer_than(page, cursor_datetime):
+    """Opportunities of a page updated after cursor_datetime"""
+    newer = []
+    for opp in page:
+        opp_updated = _parse_iso(opp.get('updatedAt'))
+        if opp_updated is None or opp_updated > cursor_datetime:
+            newer.append(opp)
+    return newer
+
+
+async def _read_opportunity_page(response, fields):
+    """(items reduced to fields, meta) of an opportunities page, decoded in executor threads"""
+    loop = asyncio.get_running_loop()
+    if opportunity_decode.FAST_JSON:
+        body = await response.read()
+        return await loop.run_in_executor(None, opportunity_decode.decode_page, body, fields)
+
+    decoder = opportunity_decode.PageDecoder(fields)
+    async for chunk in response.content.iter_chunked(PAGE_CHUNK_SIZE):
+        await loop.run_in_executor(None, decoder.feed, chunk)
+    return await loop.run_in_executor(None, decoder.close)
+
+
+async def _produce_opportunity_pages(session, url_base, center, query, fields, queue, prefetch):
+    """Put each decoded page on queue as ('page', items), then ('end', error or None)"""
     start_after_id = None
     start_after = None
-    has_more = True
-
     headers = {
         'Authorization': f'Bearer {center["apiKey"]}',
         'Location-Id': center["locationId"]
     }
 
-    while has_more:
-        url = f"{url_base}?limit=100"
+    while True:
+        url = f"{url_base}?limit=100{query}"
         if start_after_id and start_after:
             url += f"&startAfterId={start_after_id}&startAfter={start_after}"
 
         try:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
+            async with _limited_request(session, 'GET', url, center['locationId'], headers=headers,
+                                        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
                 if response.status != 200:
-                    st.error(f"Error fetching opportunities for {center['centerName']}: HTTP {response.status}")
-                    break
-
-                data = await response.json()
-                items.extend(data.get('opportunities', []))
-
-                meta = data.get('meta', {})
-                if meta.get('nextPageUrl'):
-                    start_after_id = meta.get('startAfterId')
-                    start_after = meta.get('startAfter')
-                else:
-                    has_more = False
+                    logger.warning("Error fetching opportunities for %s: HTTP %s", center['centerName'], response.status)
+                    await queue.put(('end', RuntimeError(f"Failed to fetch opportunities: HTTP {response.status}")))
+                    return
+                page, meta = await _read_opportunity_page(response, fields)
         except asyncio.TimeoutError:
-            st.error(f"Timeout fetching data for {center['centerName']}")
-            break
+            logger.warning("Timeout fetching data for %s", center['centerName'])
+            await queue.put(('end', RuntimeError("Timeout fetching opportunities")))
+            return
         except Exception as e:
-            st.error(f"Error fetching data for {center['centerName']}: {str(e)}")
-            break
+            logger.warning("Error fetching data for %s: %s", center['centerName'], e)
+            await queue.put(('end', e))
+            return
+
+        await queue.put(('page', page))
+        if not prefetch:
+            await queue.join()
+        if not meta.get('nextPageUrl'):
+            await queue.put(('end', None))
+            return
+        start_after_id = meta.get('startAfterId')
+        start_after = meta.get('startAfter')
+
+
+async def _fetch_opportunity_pages(session, url_base, center, updated_after=None, items=None, query='',
+                                   fields=opportunity_store.OPPORTUNITY_FIELDS, newest_first=False):
+    """
+    Paginate a pipeline's opportunities into items, keeping those updated after updated_after.
+    Returns (items, error); error is None unless a request failed.
+    """
+    items = [] if items is None else items
+    cursor_datetime = _parse_iso(updated_after) if updated_after else None
+    # Pages most recently updated first can stop at the first one with nothing new (no prefetch then)
+    stop_early = cursor_datetime is not None and newest_first
+
+    queue = asyncio.Queue(maxsize=PAGE_PIPELINE_DEPTH)
+    producer = asyncio.ensure_future(_produce_opportunity_pages(
+        session, url_base, center, query, fields, queue, prefetch=not stop_early
+    ))
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == 'end':
+                return items, value
+
+            kept = value if cursor_datetime is None else _newer_than(value, cursor_datetime)
+            items.extend(kept)
+            if stop_early and not kept:
+                return items, None
+            queue.task_done()
+    finally:
+        producer.cancel()
 
+
+async def fetch_all_opportunities(session, url_base, center):
+    """Fetch all opportunities with pagination - optimized"""
+    items, _ = await _fetch_opportunity_pages(session, url_base, center, fields=None)
     return items
 
 
-async def get_center_stats_base(session, center, start_datetime, end_datetime, date_field='updatedAt'):
-    """Base function for getting center stats with configurable date field - optimized"""
+async def sync_pipeline_opportunities(session, center, pipeline):
+    """
+    Bring the local opportunity store up to date for a pipeline (metadata from get_pipeline_metadata)
+    and return (its opportunities as an OpportunityBatch, error). error is the exception that
+    interrupted the download (None when complete): the batch then only holds what the store had
+    plus the pages received.
+    The first sync (and one every FULL_RESYNC_INTERVAL) downloads the whole pipeline;
+    otherwise only opportunities updated after the stored cursor are kept, and the pages are
+    only read until the cursor when a full download showed they come most recently updated first.
+    Concurrent syncs of the same pipeline (e.g. several sessions at once) share one run.
+    """
+    return await single_flight.do(
+        ('sync', center['locationId'], pipeline['id']),
+        lambda: _sync_pipeline_opportunities(session, center, pipeline)
+    )
+
+
+async def _sync_pipeline_opportunities(session, center, pipeline):
+    location_id = center['locationId']
+    pipeline_id = pipeline['id']
+    state = await _off_loop(opportunity_store.get_sync_state, location_id, pipeline_id)
+    full_sync = opportunity_store.needs_full_sync(state)
+    previous_cursor = None if full_sync else state['cursor']
+    newest_first = not full_sync and state['newest_first']
+
+    opp_url = f"{HIGHLEVEL_API_URL}/pipelines/{pipeline_id}/opportunities"
+    items = []
     try:
-        headers = {
-            'Authorization': f'Bearer {center["apiKey"]}',
-            'Location-Id': center["locationId"]
-        }
+        _, error = await _fetch_opportunity_pages(
+            session, opp_url, center, updated_after=previous_cursor, items=items, newest_first=newest_first
+        )
+    except asyncio.CancelledError:
+        # Nobody waits for this sync any more: keep the pages already downloaded (the cursor
+        # stays put, so the next sync pulls them again along with the rest). Not awaited: the
+        # task is being cancelled, the write finishes in its executor thread.
+        if items:
+            asyncio.get_running_loop().run_in_executor(
+                None, opportunity_store.save_opportunities, location_id, pipeline_id, items, previous_cursor
+            )
+        raise
+
+    # Advance the cursor only after a complete pass so an interrupted sync is retried next time
+    complete = error is None
+    cursor = previous_cursor
+    if complete:
+        cursor_datetime = _parse_iso(cursor) if cursor else None
+        for opp in items:
+            opp_updated = _parse_iso(opp.get('updatedAt'))
+            if opp_updated and (cursor_datetime is None or opp_updated > cursor_datetime):
+                cursor, cursor_datetime = opp['updatedAt'], opp_updated
+
+    # A full download shows the order the API pages this pipeline in
+    if full_sync and complete:
+        newest_first = await _off_loop(_pages_newest_first, items)
+    else:
+        newest_first = None
 
-        # Fetch pipelines
-        pipeline_url = 'https://rest.gohighlevel.com/v1/pipelines/'
+    if items or complete:
+        await _off_loop(functools.partial(
+            opportunity_store.save_opportunities,
+            location_id, pipeline_id, items, cursor, full_sync=full_sync and complete, newest_first=newest_first
+        ))
 
-        async with session.get(pipeline_url, headers=headers, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
-            if response.status != 200:
-                return {
-                    'centerName': center['centerName'],
-                    'city': center['city'],
-                    'error': f'Failed to fetch pipelines: {response.status}'
-                }
+    batch = await _off_loop(opportunity_store.load_batch, location_id, pipeline_id, pipeline['stageCode'])
+    return batch, error
 
-            data = await response.json()
-            pipelines = data.get('pipelines', [])
 
-        # Find target pipeline
-        target_pipeline = next((p for p in pipelines if p['name'] == center['pipelineName']), None)
-        if not target_pipeline:
-            return {
+async def _fetch_pipelines(session, center):
+    """Fetch all pipelines of the center's location; returns (pipelines, error_result)"""
+    pipeline_url = f"{HIGHLEVEL_API_URL}/pipelines/"
+    headers = {
+        'Authorization': f'Bearer {center["apiKey"]}',
+        'Location-Id': center["locationId"]
+    }
+
+    async with _limited_request(session, 'GET', pipeline_url, center['locationId'], headers=headers,
+                                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
+        if response.status != 200:
+            return None, {
                 'centerName': center['centerName'],
                 'city': center['city'],
-                'error': 'Pipeline not found'
+                'error': f'Failed to fetch pipelines: {response.status}'
             }
 
-        # Create stage mapping
-        stage_id_to_name = {stage['id']: stage['name'] for stage in target_pipeline.get('stages', [])}
-
-        # Fetch opportunities
-        opp_url = f"https://rest.gohighlevel.com/v1/pipelines/{target_pipeline['id']}/opportunities"
-        all_opportunities = await fetch_all_opportunities(session, opp_url, center)
-
-        # Filter by date and enrich with stage info
-        opp_filtered_by_date = []
-        for opp in all_opportunities:
-            date_value = opp.get(date_field)
-            if date_value:
-                try:
-                    opp_datetime = datetime.fromisoformat(date_value.replace('Z', '+00:00'))
-                    if start_datetime <= opp_datetime <= end_datetime:
-                        stage_name = stage_id_to_name.get(opp.get('pipelineStageId', ''), '')
-                        opp_filtered_by_date.append({
-                            **opp,
-                            'stageName': stage_name,
-                            'stageCanonical': canonical(stage_name)
-                        })
-                except (ValueError, AttributeError):
-                    continue
-
-        # TOTAL = All opportunities in pipeline (excluding Database Reactivation)
-        totalRDVPlanifies = sum(1 for o in opp_filtered_by_date if o['stageCanonical'] != EXCLUDED_STAGE_CANON)
-
-        # Filter out Database Reactivation for stage counting
-        opp_filtered = [o for o in opp_filtered_by_date if o['stageCanonical'] != EXCLUDED_STAGE_CANON]
-
-        # Count by canonical stage
-        stage_counts = {
-            'annule': 0,
-            'confirme': 0,
-            'pas_venu': 0,
-            'present': 0,
-            'concretise': 0,
-            'non_confirme': 0,
-            'non_qualifie': 0,
-            'sans_reponse': 0
-        }
+        data = await response.json()
+        return data.get('pipelines', []), None
 
-        for o in opp_filtered:
-            stage = o['stageCanonical']
-            if stage in stage_counts:
-                stage_counts[stage] += 1
-
-        annule = stage_counts['annule']
-        confirme = stage_counts['confirme']
-        pas_venu = stage_counts['pas_venu']
-        present = stage_counts['present']
-        concretise = stage_counts['concretise']
-        non_confirme = stage_counts['non_confirme']
-        non_qualifie = stage_counts['non_qualifie']
-        sans_reponse = stage_counts['sans_reponse']
-
-        confirmes = confirme + pas_venu + present + concretise
-        show_up = present + concretise
-
-        # Calculate metrics with numeric values for color coding
-        confirmation_rate = pct(confirmes, totalRDVPlanifies)
-        cancellation_rate = pct(annule, totalRDVPlanifies)
-        no_show_rate = pct(pas_venu, confirmes)
-        presence_rate = pct(show_up, confirmes)
-        conversion_rate = pct(concretise, show_up)
-
-        metrics = {
-            'totalRDVPlanifies': totalRDVPlanifies,
-            'rdvConfirmes': confirmes,
-            'showUp': show_up,
-            'tauxConfirmation': pct_str(confirmes, totalRDVPlanifies),
-            'tauxAnnulation': pct_str(annule, totalRDVPlanifies),
-            'tauxNoShow': pct_str(pas_venu, confirmes),
-            'tauxPresence': pct_str(show_up, confirmes),
-            'tauxConversion': pct_str(concretise, show_up),
-            # Numeric values for color coding
-            'confirmationRateNum': confirmation_rate,
-            'cancellationRateNum': cancellation_rate,
-            'noShowRateNum': no_show_rate,
-            'presenceRateNum': presence_rate,
-            'conversionRateNum': conversion_rate,
-            'details': {
-                'annule': annule,
-                'confirme': confirme,
-                'pasVenu': pas_venu,
-                'present': present,
-                'concretise': concretise,
-                'nonConfirme': non_confirme,
-                'nonQualifie': non_qualifie,
-                'sansReponse': sans_reponse
-            }
-        }
 
-        # Stage stats
-        stageStats = {}
-        for o in opp_filtered:
-            stageCanonical = o['stageCanonical'] or 'unknown'
-            stageStats[stageCanonical] = stageStats.get(stageCanonical, 0) + 1
+def _pipeline_metadata(pipeline):
+    """Pipeline id/name plus precomputed stage_id -> name / stage code tables"""
+    stages = {stage['id']: stage['name'] for stage in pipeline.get('stages', [])}
+    return {
+        'id': pipeline['id'],
+        'name': pipeline['name'],
+        'stages': stages,
+        'stageCode': {stage_id: stage_classifier.stage_code(name) for stage_id, name in stages.items()}
+    }
 
-        return {
+
+async def get_pipeline_metadata(session, center, refresh=False):
+    """
+    Metadata of the center's configured pipeline, cached per locationId for PIPELINE_CACHE_TTL.
+    A pipeline missing from a cached entry triggers one refetch (e.g. a renamed pipeline).
+    Returns (metadata, error_result).
+    """
+    location_id = center['locationId']
+    entry = _pipeline_cache.get(location_id)
+    fresh = entry is not None and time_module.monotonic() - entry['fetched_at'] < PIPELINE_CACHE_TTL
+
+    if refresh or not fresh:
+        # Concurrent sessions missing the same location share one request
+        pipelines, error = await single_flight.do(('pipelines', location_id), lambda: _fetch_pipelines(session, center))
+        if error:
+            return None, error
+        entry = {
+            'fetched_at': time_module.monotonic(),
+            'pipelines': {p['name']: _pipeline_metadata(p) for p in pipelines}
+        }
+        _pipeline_cache[location_id] = entry
+
+    metadata = entry['pipelines'].get(center['pipelineName'])
+    if metadata is None:
+        if fresh and not refresh:
+            return await get_pipeline_metadata(session, center, refresh=True)
+        return None, {
             'centerName': center['centerName'],
             'city': center['city'],
-            'pipeline': {'id': target_pipeline['id'], 'name': target_pipeline['name']},
-            'stageStats': stageStats,
-            'metrics': metrics,
-            'filter': {
-                'startDate': start_datetime.isoformat(),
-                'endDate': end_datetime.isoformat()
-            }
+            'error': 'Pipeline not found'
+        }
+
+    return metadata, None
+
+
+def invalidate_pipeline_cache(location_id=None):
+    """Drop cached pipeline metadata for one location (or all of them)"""
+    if location_id is None:
+        _pipeline_cache.clear()
+    else:
+        _pipeline_cache.pop(location_id, None)
+
+
+def _stage_metrics(counts):
+    """Pipeline metrics dict from stage code counts (see stage_classifier.count_stages)"""
+    code = stage_classifier.STAGE_CODE
+
+    # TOTAL = All opportunities in pipeline (excluding Database Reactivation)
+    totalRDVPlanifies = int(counts.sum() - counts[stage_classifier.EXCLUDED_CODE])
+
+    annule = int(counts[code['annule']])
+    confirme = int(counts[code['confirme']])
+    pas_venu = int(counts[code['pas_venu']])
+    present = int(counts[code['present']])
+    concretise = int(counts[code['concretise']])
+    non_confirme = int(counts[code['non_confirme']])
+    non_qualifie = int(counts[code['non_qualifie']])
+    sans_reponse = int(counts[code['sans_reponse']])
+
+    confirmes = confirme + pas_venu + present + concretise
+    show_up = present + concretise
+
+    # Calculate metrics with numeric values for color coding
+    confirmation_rate = pct(confirmes, totalRDVPlanifies)
+    cancellation_rate = pct(annule, totalRDVPlanifies)
+    no_show_rate = pct(pas_venu, confirmes)
+    presence_rate = pct(show_up, confirmes)
+    conversion_rate = pct(concretise, show_up)
+
+    return {
+        'totalRDVPlanifies': totalRDVPlanifies,
+        'rdvConfirmes': confirmes,
+        'showUp': show_up,
+        'tauxConfirmation': pct_str(confirmes, totalRDVPlanifies),
+        'tauxAnnulation': pct_str(annule, totalRDVPlanifies),
+        'tauxNoShow': pct_str(pas_venu, confirmes),
+        'tauxPresence': pct_str(show_up, confirmes),
+        'tauxConversion': pct_str(concretise, show_up),
+        # Numeric values for color coding
+        'confirmationRateNum': confirmation_rate,
+        'cancellationRateNum': cancellation_rate,
+        'noShowRateNum': no_show_rate,
+        'presenceRateNum': presence_rate,
+        'conversionRateNum': conversion_rate,
+        'details': {
+            'annule': annule,
+            'confirme': confirme,
+            'pasVenu': pas_venu,
+            'present': present,
+            'concretise': concretise,
+            'nonConfirme': non_confirme,
+            'nonQualifie': non_qualifie,
+            'sansReponse': sans_reponse
+        }
+    }
+
+
+def _center_stats_result(center, pipeline, counts, start_datetime, end_datetime):
+    """Stats dict of a center (stage stats + metrics) from its stage code counts"""
+    return {
+        'centerName': center['centerName'],
+        'city': center['city'],
+        'pipeline': {'id': pipeline['id'], 'name': pipeline['name']},
+        'stageStats': stage_classifier.stage_stats(counts),
+        'metrics': _stage_metrics(counts),
+        'filter': {
+            'startDate': start_datetime.isoformat(),
+            'endDate': end_datetime.isoformat()
         }
+    }
+
+
+async def get_center_stats_base(session, center, start_datetime, end_datetime, date_field='updatedAt'):
+    """Base function for getting center stats with configurable date field - optimized"""
+    try:
+        target_pipeline, error = await get_pipeline_metadata(session, center)
+        if error:
+            return error
+
+        # Opportunities from the local store (synced incrementally) as columnar arrays
+        batch, sync_error = await sync_pipeline_opportunities(session, center, target_pipeline)
+        if sync_error:
+            raise sync_error
+
+        # Vectorized date filter + stage count
+        counts = batch.stage_counts(date_field, start_datetime.timestamp(), end_datetime.timestamp())
+
+        return _center_stats_result(center, target_pipeline, counts, start_datetime, end_datetime)
 
     except Exception as e:
         return {
@@ -215,6 +523,182 @@ async def get_center_stats_created(session, center, start_datetime, end_datetime
     return await get_center_stats_base(session, center, start_datetime, end_datetime, 'createdAt')
 
 
+OPPORTUNITY_DATE_FIELDS = ('updatedAt', 'createdAt')
+
+# Answer a range of a never-synced pipeline with a date-filtered request instead of waiting for
+# the full download (which then runs in the background). Off until startDate/endDate are confirmed
+# to filter on updatedAt against the real API (tests/test_center_views.py checks the stub).
+OPPORTUNITY_WINDOW_SEARCH = False
+
+
+def _opportunity_batch(items, pipeline):
+    """OpportunityBatch from raw API opportunities"""
+    def epoch(value):
+        parsed = _parse_iso(value)
+        return parsed.timestamp() if parsed else float('nan')
+
+    return OpportunityBatch.from_columns(
+        [o.get('id') for o in items],
+        [epoch(o.get('createdAt')) for o in items],
+        [epoch(o.get('updatedAt')) for o in items],
+        [o.get('pipelineStageId') for o in items],
+        [o.get('status') for o in items],
+        pipeline['stageCode']
+    )
+
+
+async def _search_opportunity_window(session, center, pipeline, first):
+    """
+    Opportunities of a pipeline updated since the start of first, filtered server-side
+    (startDate/endDate in epoch ms, assumed to filter on updatedAt; the window runs up to now,
+    since anything created or updated within first..last was last updated after first).
+    Returns an OpportunityBatch, or None when the filtered search failed and the caller should
+    fall back to the full pipeline sync.
+    """
+    start_ms = int(datetime.combine(first, time.min, tzinfo=timezone.utc).timestamp() * 1000)
+    end_ms = int(time_module.time() * 1000)
+    opp_url = f"{HIGHLEVEL_API_URL}/pipelines/{pipeline['id']}/opportunities"
+    items, error = await _fetch_opportunity_pages(
+        session, opp_url, center, query=f"&startDate={start_ms}&endDate={end_ms}"
+    )
+    if error:
+        return None
+    return await _off_loop(_opportunity_batch, items, pipeline)
+
+
+async def _refresh_center_days(session, center, pipeline, first, last):
+    """
+    Sync a center's pipeline and cache its per-day counts for first..last; returns {date_field: {day: counts}}.
+    Raises the download's error when it is incomplete (nothing is cached). Counts answered by the
+    window search are returned without being cached.
+    """
+    never_synced = await _off_loop(opportunity_store.get_sync_state, center['locationId'], pipeline['id']) is None
+    if OPPORTUNITY_WINDOW_SEARCH and never_synced:
+        batch = await single_flight.do(
+            ('window', center['locationId'], pipeline['id'], first),
+            lambda: _search_opportunity_window(session, center, pipeline, first)
+        )
+        if batch is not None:
+            _refresh_in_background(
+                ('sync', center['locationId'], pipeline['id']),
+                sync_pipeline_opportunities(session, center, pipeline)
+            )
+            return await _off_loop(_center_days, batch, first, last)
+
+    batch, error = await sync_pipeline_opportunities(session, center, pipeline)
+    # Counts from a partial download would be cached as real zeros
+    if error:
+        raise error
+    return await _off_loop(_store_center_days, center['locationId'], batch, first, last)
+
+
+def _center_days(batch, first, last):
+    """Per-day counts of a batch for first..last by stage name; {date_field: {day: counts}} (blocking)"""
+    first_ts = datetime.combine(first, time.min, tzinfo=timezone.utc).timestamp()
+    span = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+    fetched = {}
+    for date_field in OPPORTUNITY_DATE_FIELDS:
+        daily = batch.daily_stage_counts(date_field, first_ts, len(span))
+        # By stage name: interned stage codes are only valid in this process
+        fetched[date_field] = {day: stage_classifier.counts_to_names(c) for day, c in zip(span, daily)}
+    return fetched
+
+
+def _store_center_days(location_id, batch, first, last):
+    """Per-day counts of a batch for first..last, cached in the day cache; {date_field: {day: counts}} (blocking)"""
+    fetched = _center_days(batch, first, last)
+    for date_field, days in fetched.items():
+        day_cache.store(f"opportunities:{date_field}", location_id, days)
+    return fetched
+
+
+def _lookup_center_days(location_id, days, freshness=None):
+    """Cached per-day counts of a center by date field: ({date_field: hits}, missing, stale) (blocking)"""
+    cached = {}
+    missing, stale = set(), set()
+    for date_field in OPPORTUNITY_DATE_FIELDS:
+        hits, field_missing, field_stale = day_cache.lookup(
+            f"opportunities:{date_field}", location_id, days, freshness
+        )
+        cached[date_field] = hits
+        missing.update(field_missing)
+        stale.update(field_stale)
+    return cached, missing, stale
+
+
+def _center_counts(cached, days):
+    """{date_field: array (len(days), n stage codes)} from cached {day: {stage: count}} (blocking)"""
+    counts = {
+        date_field: stage_classifier.counts_matrix([cached[date_field][day] for day in days])
+        for date_field in OPPORTUNITY_DATE_FIELDS
+    }
+    # Codes may have been interned while building the second matrix; align the widths
+    width = stage_classifier.n_codes()
+    return {field: np.pad(m, ((0, 0), (0, width - m.shape[1]))) for field, m in counts.items()}
+
+
+async def get_center_daily_counts(session, center, days, freshness=None):
+    """
+    Per-day stage code counts of a center for the given consecutive days, by updatedAt and createdAt.
+    Days already in the day cache are reused; the pipeline is synced only when some are missing.
+    When the only problem is stale days, they are served as-is and refreshed in the background.
+    Returns (pipeline metadata, {date_field: array (len(days), n stage codes)}, error).
+    """
+    target_pipeline, error = await get_pipeline_metadata(session, center)
+    if error:
+        return None, None, error
+
+    location_id = center['locationId']
+    cached, missing, stale = await _off_loop(_lookup_center_days, location_id, days, freshness)
+
+    if missing:
+        fetched = await _refresh_center_days(session, center, target_pipeline, *missing_span(missing | stale))
+        for date_field in OPPORTUNITY_DATE_FIELDS:
+            cached[date_field].update(fetched[date_field])
+        if freshness is not None:
+            freshness.observe(time_module.time())
+    elif stale:
+        refresh = _refresh_in_background(
+            ('opportunities', location_id),
+            _refresh_center_days(session, center, target_pipeline, *missing_span(stale))
+        )
+        if freshness is not None:
+            freshness.track(refresh)
+
+    return target_pipeline, await _off_loop(_center_counts, cached, days), None
+
+
+async def get_center_views(session, center, start_datetime, end_datetime, freshness=None):
+    """
+    Single pass over a center's opportunities: one pipeline sync feeds every view of the range.
+    Returns {'updated': stats by updatedAt, 'created': stats by createdAt, 'rates': rates KPIs (createdAt)}.
+    """
+    try:
+        target_pipeline, daily, error = await get_center_daily_counts(
+            session, center, day_range(start_datetime, end_datetime), freshness
+        )
+        if error:
+            return {'updated': error, 'created': error, 'rates': error}
+
+        updated_counts = daily['updatedAt'].sum(axis=0)
+        created_counts = daily['createdAt'].sum(axis=0)
+
+        return {
+            'updated': _center_stats_result(center, target_pipeline, updated_counts, start_datetime, end_datetime),
+            'created': _center_stats_result(center, target_pipeline, created_counts, start_datetime, end_datetime),
+            'rates': _rates_kpis_from_counts(center, created_counts)
+        }
+
+    except Exception as e:
+        error = {
+            'centerName': center['centerName'],
+            'city': center['city'],
+            'error': str(e)
+        }
+        return {'updated': error, 'created': error, 'rates': error}
+
+
 def _prepare_datetime_range(start_date_str, end_date_str):
     """Helper function to prepare datetime range"""
     start_date = datetime.fromisoformat(start_date_str)
@@ -224,93 +708,189 @@ def _prepare_datetime_range(start_date_str, end_date_str):
     return start_datetime, end_datetime
 
 
-def _execute_async_tasks(tasks):
-    """Helper function to execute async tasks with optimized connection pooling"""
-    async def fetch_all():
-        # Optimized connector with connection pooling
-        connector = aiohttp.TCPConnector(
-            limit=CONNECTOR_LIMIT,
-            limit_per_host=CONNECTOR_LIMIT_PER_HOST,
-            ttl_dns_cache=300
-        )
-        timeout = aiohttp.ClientTimeout(total=60, connect=10)
+async def _finish_in_background(late):
+    await asyncio.gather(*late, return_exceptions=True)
 
-        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            return await asyncio.gather(*tasks(session), return_exceptions=True)
 
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+def _execute_async_tasks(tasks, host=async_runtime.HIGHLEVEL_HOST, deadline=None):
+    """
+    Helper function to execute async tasks on the shared runtime with its pooled session for host.
+    Inside a page run the work belongs to the session's fetch job (cancelled when filters change).
+    Tasks still running when deadline (a scheduler.Deadline) passes get a DeadlineExceeded result
+    and keep running in the background to fill the caches.
+    """
+    deadline = deadline or scheduler.Deadline()
 
-    return loop.run_until_complete(fetch_all())
+    async def fetch_all():
+        session = async_runtime.get_session(host)
+        running = [asyncio.ensure_future(task) for task in tasks(session)]
+        if not running:
+            return [], None
+        try:
+            done, late = await asyncio.wait(running, timeout=deadline.remaining())
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+            raise
+        results = [
+            scheduler.DeadlineExceeded() if task in late
+            else task.exception() if task.exception() is not None else task.result()
+            for task in running
+        ]
+        return results, async_runtime.submit_future(_finish_in_background(late)) if late else None
+
+    job = fetch_jobs.current()
+    if job is None:
+        return async_runtime.submit(fetch_all())[0]
+    results, background = job.wait(async_runtime.submit_future(fetch_all()))
+    if background is not None:
+        job.track(background)
+    return results
 
 
-@st.cache_data(ttl=300)
-def fetch_centers_data(start_date_str, end_date_str, selected_center_names):
-    """Fetch data for selected centers (filtered by updatedAt)"""
+def _error_result(center, error, freshness=None):
+    """Per-center error result; work cut off by the latency budget is flagged 'pending' (and noted in freshness)"""
+    result = {'centerName': center['centerName'], 'city': center['city'], 'error': str(error)}
+    if isinstance(error, scheduler.DeadlineExceeded):
+        result['pending'] = True
+        if freshness is not None:
+            freshness.pending.add(center['centerName'])
+    return result
+
+
+def fetch_center_views(start_date_str, end_date_str, selected_center_names, freshness=None, latency_budget=None):
+    """
+    Fetch every opportunity view (updatedAt stats, createdAt stats, rates KPIs) for the selected
+    centers with at most one download per center. Results are assembled from the center x day
+    cache, so overlapping ranges only fetch what is missing. fetch_centers_data,
+    fetch_centers_data_created, fetch_rates_kpis_for_centers and fetch_combined_performance_data
+    all read from this call. Expired days are served right away and refreshed in the background;
+    pass a day_cache.Freshness to learn the age of the data (latency_budget: see scheduler.deadline).
+    """
     from config import CENTERS
 
     start_datetime, end_datetime = _prepare_datetime_range(start_date_str, end_date_str)
     selected_centers = [c for c in CENTERS if c['centerName'] in selected_center_names]
 
     def create_tasks(session):
-        return [get_center_stats(session, center, start_datetime, end_datetime) for center in selected_centers]
+        return [get_center_views(session, center, start_datetime, end_datetime, freshness) for center in selected_centers]
 
-    return _execute_async_tasks(create_tasks)
+    views = _execute_async_tasks(create_tasks, deadline=scheduler.deadline(latency_budget))
 
+    for i, (center, view) in enumerate(zip(selected_centers, views)):
+        if isinstance(view, Exception):
+            error = _error_result(center, view, freshness)
+            views[i] = {'updated': error, 'created': error, 'rates': error}
 
-@st.cache_data(ttl=300)
-def fetch_centers_data_created(start_date_str, end_date_str, selected_center_names):
-    """Fetch data for selected centers (filtered by createdAt)"""
-    from config import CENTERS
+    return views
 
-    start_datetime, end_datetime = _prepare_datetime_range(start_date_str, end_date_str)
-    selected_centers = [c for c in CENTERS if c['centerName'] in selected_center_names]
 
-    def create_tasks(session):
-        return [get_center_stats_created(session, center, start_datetime, end_datetime) for center in selected_centers]
+def fetch_centers_data(start_date_str, end_date_str, selected_center_names, freshness=None, latency_budget=None):
+    """Fetch data for selected centers (filtered by updatedAt)"""
+    return [
+        view['updated']
+        for view in fetch_center_views(start_date_str, end_date_str, selected_center_names, freshness, latency_budget)
+    ]
 
-    return _execute_async_tasks(create_tasks)
+
+def fetch_centers_data_created(start_date_str, end_date_str, selected_center_names, freshness=None, latency_budget=None):
+    """Fetch data for selected centers (filtered by createdAt)"""
+    return [
+        view['created']
+        for view in fetch_center_views(start_date_str, end_date_str, selected_center_names, freshness, latency_budget)
+    ]
 
 
 # APPOINTMENTS FUNCTIONS
+APPOINTMENT_WINDOW_DAYS = 7  # days per /appointments/ request; a calendar's windows are fetched concurrently
+# Appointment fields kept in the day cache (everything else in the API payload is dropped)
+APPOINTMENT_FIELDS = ('id', 'startTime', 'appointmentStatus', 'status')
+
+
+def _appointment_windows(days):
+    """Split days into runs of consecutive days of at most APPOINTMENT_WINDOW_DAYS: [(first, last)]"""
+    windows = []
+    for day in sorted(days):
+        if windows and day - windows[-1][1] == timedelta(days=1) and (day - windows[-1][0]).days < APPOINTMENT_WINDOW_DAYS:
+            windows[-1] = (windows[-1][0], day)
+        else:
+            windows.append((day, day))
+    return windows
+
+
 async def fetch_appointments_from_calendar(session, center, calendar_id, start_date, end_date):
-    """Fetch appointments from a single calendar within date range"""
+    """
+    Fetch appointments from a single calendar starting between start_date and end_date (whole
+    UTC days), as one request. Returns None when the request failed.
+    """
     if not calendar_id:
         return []
 
-    try:
-        start_epoch = int(datetime.fromisoformat(start_date).replace(tzinfo=timezone.utc).timestamp() * 1000)
-        end_epoch = int(datetime.fromisoformat(end_date).replace(tzinfo=timezone.utc).timestamp() * 1000)
+    first, last = to_date(start_date), to_date(end_date)
+    start_epoch = int(datetime.combine(first, time.min, tzinfo=timezone.utc).timestamp() * 1000)
+    end_epoch = int(datetime.combine(last, time.max, tzinfo=timezone.utc).timestamp() * 1000)
 
-        url = f"https://rest.gohighlevel.com/v1/appointments/?startDate={start_epoch}&endDate={end_epoch}&calendarId={calendar_id}&includeAll=true"
+    url = f"{HIGHLEVEL_API_URL}/appointments/?startDate={start_epoch}&endDate={end_epoch}&calendarId={calendar_id}&includeAll=true"
 
-        headers = {
-            'Authorization': f'Bearer {center["apiKey"]}',
-            'Location-Id': center["locationId"]
-        }
+    headers = {
+        'Authorization': f'Bearer {center["apiKey"]}',
+        'Location-Id': center["locationId"]
+    }
 
-        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
-            if response.status != 200:
-                return []
-            data = await response.json()
-            return data.get('appointments', [])
-    except Exception:
-        return []
+    async def fetch():
+        try:
+            async with _limited_request(session, 'GET', url, center['locationId'], headers=headers,
+                                        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
+                if response.status != 200:
+                    logger.warning("Error fetching appointments for %s: HTTP %s", center['centerName'], response.status)
+                    return None
+                data = await response.json()
+        except asyncio.TimeoutError:
+            logger.warning("Timeout fetching appointments for %s", center['centerName'])
+            return None
+        except Exception as e:
+            logger.warning("Error fetching appointments for %s: %s", center['centerName'], e)
+            return None
+        return [{field: a.get(field) for field in APPOINTMENT_FIELDS} for a in data.get('appointments', [])]
+
+    return await single_flight.do(('appointments', calendar_id, start_epoch, end_epoch), fetch)
+
+
+def _appointments_by_start_day(appointments, first, last):
+    """{day: [appointments]} for every day of first..last, by the UTC day of startTime"""
+    by_day = {day: [] for day in day_range(first, last)}
+    for appointment in appointments:
+        start = _parse_iso(appointment.get('startTime'))
+        day = start.astimezone(timezone.utc).date() if start else first
+        by_day[min(max(day, first), last)].append(appointment)
+    return by_day
+
+
+async def _fetch_calendar_window(session, center, calendar_id, first, last):
+    """Fetch one window of a calendar and cache it per day; returns its appointments, or None on failure"""
+    appointments = await fetch_appointments_from_calendar(session, center, calendar_id, first, last)
+    if appointments is not None:
+        await _off_loop(day_cache.store, 'appointments', calendar_id, _appointments_by_start_day(appointments, first, last))
+    return appointments
 
 
 def get_date_from_iso(iso_string):
     return iso_string.split('T')[0] if iso_string else 'unknown'
 
 
-def merge_appointments_by_day(appointments):
-    appointments_by_day = {}
+def merge_appointments_by_day(appointments, appointments_by_day=None, seen_ids=None):
+    """
+    Count appointments per day and status. Pass the previous appointments_by_day to add a batch to
+    it, and a seen_ids set to skip appointments already counted (same id in another window or calendar).
+    """
+    if appointments_by_day is None:
+        appointments_by_day = {}
     for appointment in appointments:
+        if seen_ids is not None and appointment.get('id'):
+            if appointment['id'] in seen_ids:
+                continue
+            seen_ids.add(appointment['id'])
+
         date = get_date_from_iso(appointment.get('startTime'))
         status = appointment.get('appointmentStatus') or appointment.get('status') or 'unknown'
         status = status.lower()
@@ -323,21 +903,41 @@ def merge_appointments_by_day(appointments):
 
 
 async def fetch_appointments(session, center, start_date, end_date):
-    """Fetch appointments from one or two calendars for a center - parallel fetching"""
-    # Fetch both calendars in parallel
-    tasks = [fetch_appointments_from_calendar(session, center, center.get('calendarId'), start_date, end_date)]
-
-    if center.get('calendarId2'):
-        tasks.append(fetch_appointments_from_calendar(session, center, center.get('calendarId2'), start_date, end_date))
+    """
+    Fetch appointments from one or two calendars for a center. Days are answered from the day
+    cache; the missing ones are split into APPOINTMENT_WINDOW_DAYS windows fetched concurrently
+    (both calendars) and merged as they arrive. Each window is cached per day once it arrives,
+    so a failed window only leaves its own days missing (complete=False) for the next call.
+    Expired days are served as-is and refreshed in the background.
+    """
+    days = day_range(start_date, end_date)
+    calendar_ids = [cid for cid in (center.get('calendarId'), center.get('calendarId2')) if cid]
 
-    results = await asyncio.gather(*tasks)
-
-    # Flatten results
-    all_appointments = []
-    for result in results:
-        all_appointments.extend(result)
-
-    appointments_by_day = merge_appointments_by_day(all_appointments)
+    appointments_by_day = {}
+    seen_ids = set()
+    tasks = []
+    for calendar_id in calendar_ids:
+        hits, missing, stale = await _off_loop(day_cache.lookup, 'appointments', calendar_id, days)
+        for day in days:
+            if day in hits:
+                merge_appointments_by_day(hits[day], appointments_by_day, seen_ids)
+        for first, last in _appointment_windows(missing):
+            tasks.append(_fetch_calendar_window(session, center, calendar_id, first, last))
+        if stale:
+            async def refresh(calendar_id=calendar_id, stale=stale):
+                await asyncio.gather(*(
+                    _fetch_calendar_window(session, center, calendar_id, first, last)
+                    for first, last in _appointment_windows(stale)
+                ))
+            _refresh_in_background(('appointments', calendar_id), refresh())
+
+    complete = True
+    for window in asyncio.as_completed(tasks):
+        appointments = await window
+        if appointments is None:
+            complete = False
+            continue
+        merge_appointments_by_day(appointments, appointments_by_day, seen_ids)
 
     return {
         'centerName': center['centerName'],
@@ -346,185 +946,352 @@ async def fetch_appointments(session, center, start_date, end_date):
         'calendarId': center.get('calendarId'),
         'calendarId2': center.get('calendarId2'),
         'appointmentsByDay': appointments_by_day,
-        'totalAppointments': len(all_appointments)
+        'totalAppointments': sum(day['total'] for day in appointments_by_day.values()),
+        'complete': complete
     }
 
 
-@st.cache_data(ttl=300)
-def fetch_appointments_for_centers(start_date_str, end_date_str, selected_center_names):
+def _appointment_totals(center):
+    """Add cumulative totals and ratios to a fetch_appointments result (in place)"""
+    appointments_by_day = center.get('appointmentsByDay', {})
+    totals = {}
+    total_appointments = 0
+
+    for day_data in appointments_by_day.values():
+        total_appointments += day_data.get('total', 0)
+        for status, count in day_data.items():
+            if status != 'total':
+                totals[status] = totals.get(status, 0) + count
+
+    center['totals'] = totals
+    center['totalAppointments'] = total_appointments
+
+    # Calculate ratios
+    confirmed = totals.get('confirmed', 0)
+    cancelled = totals.get('cancelled', 0)
+    noshow = totals.get('noshow', 0)
+    showed = totals.get('showed', 0)
+
+    if total_appointments > 0:
+        confirmed_total = confirmed + showed + noshow
+        confirmation_rate = confirmed_total / total_appointments * 100
+        cancellation_rate = cancelled / total_appointments * 100
+        no_show_rate = (noshow / confirmed_total * 100) if confirmed_total > 0 else 0
+        show_up_rate = (showed / confirmed_total * 100) if confirmed_total > 0 else 0
+
+        center['ratios'] = {
+            'confirmationRate': round(confirmation_rate, 2),
+            'cancellationRate': round(cancellation_rate, 2),
+            'noShowRate': round(no_show_rate, 2),
+            'showUpRate': round(show_up_rate, 2)
+        }
+    else:
+        center['ratios'] = {
+            'confirmationRate': 0.0,
+            'cancellationRate': 0.0,
+            'noShowRate': 0.0,
+            'showUpRate': 0.0
+        }
+
+    return center
+
+
+def fetch_appointments_for_centers(start_date_str, end_date_str, selected_center_names, latency_budget=None):
+    """
+    Fetch appointments for selected centers. Results are cached per center and range, so only
+    centers without a fresh entry are fetched when the selection changes.
+    """
     from config import CENTERS
 
     selected_centers = [c for c in CENTERS if c['centerName'] in selected_center_names]
+    params = (start_date_str, end_date_str)
 
-    def create_tasks(session):
-        return [fetch_appointments(session, center, start_date_str, end_date_str) for center in selected_centers]
-
-    results = _execute_async_tasks(create_tasks)
-
-    # --- CUMULATIVE CALCULATION ---
-    for center in results:
-        appointments_by_day = center.get('appointmentsByDay', {})
-        totals = {}
-        total_appointments = 0
-
-        for day_data in appointments_by_day.values():
-            total_appointments += day_data.get('total', 0)
-            for status, count in day_data.items():
-                if status != 'total':
-                    totals[status] = totals.get(status, 0) + count
-
-        center['totals'] = totals
-        center['totalAppointments'] = total_appointments
-
-        # Calculate ratios
-        confirmed = totals.get('confirmed', 0)
-        cancelled = totals.get('cancelled', 0)
-        noshow = totals.get('noshow', 0)
-        showed = totals.get('showed', 0)
-
-        if total_appointments > 0:
-            confirmed_total = confirmed + showed + noshow
-            confirmation_rate = confirmed_total / total_appointments * 100
-            cancellation_rate = cancelled / total_appointments * 100
-            no_show_rate = (noshow / confirmed_total * 100) if confirmed_total > 0 else 0
-            show_up_rate = (showed / confirmed_total * 100) if confirmed_total > 0 else 0
-
-            center['ratios'] = {
-                'confirmationRate': round(confirmation_rate, 2),
-                'cancellationRate': round(cancellation_rate, 2),
-                'noShowRate': round(no_show_rate, 2),
-                'showUpRate': round(show_up_rate, 2)
-            }
-        else:
-            center['ratios'] = {
-                'confirmationRate': 0.0,
-                'cancellationRate': 0.0,
-                'noShowRate': 0.0,
-                'showUpRate': 0.0
-            }
+    results = {c['centerName']: result_cache.get('appointments', c['locationId'], params) for c in selected_centers}
+    missing = [c for c in selected_centers if results[c['centerName']] is None]
 
-    return results
+    if missing:
+        def create_tasks(session):
+            return [fetch_appointments(session, center, start_date_str, end_date_str) for center in missing]
+
+        results_missing = _execute_async_tasks(create_tasks, deadline=scheduler.deadline(latency_budget))
+        for center, result in zip(missing, results_missing):
+            if isinstance(result, scheduler.DeadlineExceeded):
+                result = {
+                    'centerName': center['centerName'],
+                    'city': center['city'],
+                    'locationId': center['locationId'],
+                    'calendarId': center.get('calendarId'),
+                    'calendarId2': center.get('calendarId2'),
+                    'appointmentsByDay': {},
+                    'complete': False,
+                    'pending': True
+                }
+            elif isinstance(result, Exception):
+                raise result
+            result = _appointment_totals(result)
+            if result['complete']:
+                result_cache.put('appointments', center['locationId'], params, result)
+            results[center['centerName']] = result
+
+    # Callers get their own copies; the cached entries stay untouched
+    return [copy.deepcopy(results[c['centerName']]) for c in selected_centers]
 
 
 # META ADS FUNCTIONS
-async def fetch_meta_metrics(session, business_id, access_token, date_start, date_stop, center):
-    """Fetch Meta Ads metrics for a business account with per-business lead action mapping"""
-    url = f"https://graph.facebook.com/v21.0/{business_id}/insights"
+META_GRAPH_URL = "https://graph.facebook.com/v21.0"
+META_INSIGHTS_FIELDS = "ctr,cpm,spend,conversions,actions,video_30_sec_watched_actions,impressions,inline_link_clicks"
+META_DAILY_PAGE_LIMIT = 500  # rows per page in daily mode (one row per day)
+META_BATCH_SIZE = 50  # Graph API limit of requests per batch call
+META_BATCH_LIMITER_KEY = 'batch'  # batch calls span accounts, so they share one limiter
 
-    params = {
-        "fields": "ctr,cpm,spend,conversions,actions,video_30_sec_watched_actions,impressions,inline_link_clicks",
-        "time_range": f"{{'since':'{date_start}','until':'{date_stop}'}}",
-        "access_token": access_token
+# Additive per-day columns of the Meta fact table; ratios are recomputed from these on roll-up
+META_DAILY_COLUMNS = ['spend', 'leads', 'impressions', 'clicks', 'inline_link_clicks',
+                      'landing_page_views', 'video_30_sec_watched']
+
+
+def _empty_meta_metrics(error):
+    return {
+        "leads": 0,
+        "spend": 0.0,
+        "cpm": 0.0,
+        "ctr": 0.0,
+        "cpr": 0.0,
+        "impressions": 0,
+        "inline_link_clicks": 0,
+        "video_30_sec_watched": 0,
+        "hook_rate": 0.0,
+        "conversion_rate": 0.0,
+        "lp_conversion_rate": 0.0,
+        "error": error
     }
 
-    # Determine which action_type to treat as leads for this center.
+
+def _lead_action_type(center):
+    """Determine which action_type to treat as leads for this center"""
     # You can replace this with a config-driven approach: center.get('leadActionType')
     center_name_norm = (center.get('centerName') or '').strip().lower()
     # Map rules
     # - Epilux => count "post" as leads
     # - Elixir => count "lead" as leads
     if 'epilux' in center_name_norm:
-        lead_action_type = 'post'
-    elif 'elixir' in center_name_norm:
-        lead_action_type = 'lead'
-    else:
-        # default behavior: no special action_type counted as lead
-        lead_action_type = center.get('leadActionType') or None
+        return 'post'
+    if 'elixir' in center_name_norm:
+        return 'lead'
+    # default behavior: no special action_type counted as lead
+    return center.get('leadActionType') or None
+
+
+def _meta_insights_params(access_token, date_start, date_stop, daily=False):
+    params = {
+        "fields": META_INSIGHTS_FIELDS,
+        "time_range": f"{{'since':'{date_start}','until':'{date_stop}'}}",
+        "access_token": access_token
+    }
+    if daily:
+        params["time_increment"] = 1
+        params["limit"] = META_DAILY_PAGE_LIMIT
+    return params
+
+
+def _meta_metrics_from_insights(insights, lead_action_type):
+    """Convert one insights row into the metrics dict (with the additive landing_page_views/clicks kept)"""
+    # Extract basic metrics
+    leads = 0
+    spend = float(insights.get("spend", 0))
+    cpm = float(insights.get("cpm", 0))
+    ctr = float(insights.get("ctr", 0))
+    impressions = int(insights.get("impressions", 0))
+    video_30_sec_watched = 0
+    landing_page_views = 0
+    inline_link_clicks = int(insights.get("inline_link_clicks", 0))
+
+    # 1) Leads from conversions (keeping the original logic)
+    for conv in insights.get("conversions", []):
+        if conv.get("action_type") == "schedule_total":
+            leads += int(conv.get("value", 0))
+
+    # 2) Leads from actions per-business mapping
+    for act in insights.get("actions", []):
+        action_type = act.get("action_type")
+
+        if inline_link_clicks == 0 and action_type == "link_click":
+            inline_link_clicks += int(act.get("value", 0))
+
+        if action_type == "landing_page_view":
+            landing_page_views += int(act.get("value", 0))
+
+        # Count leads by mapped action_type, if configured
+        if lead_action_type and action_type == lead_action_type:
+            leads += int(act.get("value", 0))
+
+    # Extract 30s video views
+    if "video_30_sec_watched_actions" in insights:
+        try:
+            for v in insights["video_30_sec_watched_actions"]:
+                video_30_sec_watched += int(v.get("value", 0))
+        except Exception:
+            pass
+
+    # Calculate metrics
+    cpr = spend / leads if leads > 0 else 0.0
+    hook_rate = (video_30_sec_watched / impressions * 100) if impressions > 0 else 0
+    conversion_rate = (leads / inline_link_clicks * 100) if inline_link_clicks > 0 else 0
+    lp_conversion_rate = (leads / landing_page_views * 100) if landing_page_views > 0 else 0
+
+    return {
+        "leads": leads,
+        "spend": spend,
+        "cpm": cpm,
+        "ctr": ctr,
+        "cpr": cpr,
+        "impressions": impressions,
+        "inline_link_clicks": inline_link_clicks,
+        "video_30_sec_watched": video_30_sec_watched,
+        "hook_rate": hook_rate,
+        "conversion_rate": conversion_rate,
+        "lp_conversion_rate": lp_conversion_rate,
+        "landing_page_views": landing_page_views,
+        # ctr is clicks / impressions * 100, so this recovers the clicks for weighted roll-ups
+        "clicks": ctr * impressions / 100
+    }
+
+
+async def _meta_days_from_pages(session, data, lead_action_type, limiter_key):
+    """Collect daily rows from a first insights page, following paging.next for the rest"""
+    days = []
+    while True:
+        for insights in data.get("data", []):
+            metrics = _meta_metrics_from_insights(insights, lead_action_type)
+            metrics["date"] = insights.get("date_start")
+            days.append(metrics)
+
+        # The next page URL already carries every query parameter
+        next_url = (data.get("paging") or {}).get("next")
+        if not next_url:
+            return {'days': days}
+
+        async with _limited_request(session, 'GET', next_url, limiter_key,
+                                    timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
+            if response.status != 200:
+                response_text = await response.text()
+                return {'days': [], 'error': f"HTTP {response.status}: {response_text[:200]}"}
+            data = await response.json()
+
+
+async def fetch_meta_metrics(session, business_id, access_token, date_start, date_stop, center, daily=False):
+    """
+    Fetch Meta Ads metrics for a business account with per-business lead action mapping.
+    With daily=True the whole range is requested with a one-day time increment (following
+    paging) and {'days': [metrics + 'date', ...]} is returned instead of a single metrics dict.
+    """
+    url = f"{META_GRAPH_URL}/{business_id}/insights"
+    params = _meta_insights_params(access_token, date_start, date_stop, daily=daily)
+    lead_action_type = _lead_action_type(center)
 
     try:
-        async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
+        async with _limited_request(session, 'GET', url, business_id, params=params,
+                                    timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
             if response.status != 200:
                 response_text = await response.text()
-                return {
-                    "leads": 0,
-                    "spend": 0.0,
-                    "cpm": 0.0,
-                    "ctr": 0.0,
-                    "cpr": 0.0,
-                    "impressions": 0,
-                    "inline_link_clicks": 0,
-                    "video_30_sec_watched": 0,
-                    "hook_rate": 0.0,
-                    "conversion_rate": 0.0,
-                    "lp_conversion_rate": 0.0,
-                    "error": f"HTTP {response.status}: {response_text[:200]}"
-                }
+                error = f"HTTP {response.status}: {response_text[:200]}"
+                return {'days': [], 'error': error} if daily else _empty_meta_metrics(error)
 
             data = await response.json()
-            insights = data.get("data", [{}])[0] if data.get("data") else {}
-
-            # Extract basic metrics
-            leads = 0
-            spend = float(insights.get("spend", 0))
-            cpm = float(insights.get("cpm", 0))
-            ctr = float(insights.get("ctr", 0))
-            impressions = int(insights.get("impressions", 0))
-            video_30_sec_watched = 0
-            landing_page_views = 0
-            inline_link_clicks = int(insights.get("inline_link_clicks", 0))
-
-            # 1) Leads from conversions (keeping the original logic)
-            for conv in insights.get("conversions", []):
-                if conv.get("action_type") == "schedule_total":
-                    leads += int(conv.get("value", 0))
-
-            # 2) Leads from actions per-business mapping
-            for act in insights.get("actions", []):
-                action_type = act.get("action_type")
-
-                if inline_link_clicks == 0 and action_type == "link_click":
-                    inline_link_clicks += int(act.get("value", 0))
-
-                if action_type == "landing_page_view":
-                    landing_page_views += int(act.get("value", 0))
-
-                # Count leads by mapped action_type, if configured
-                if lead_action_type and action_type == lead_action_type:
-                    leads += int(act.get("value", 0))
-
-            # Extract 30s video views
-            if "video_30_sec_watched_actions" in insights:
-                try:
-                    for v in insights["video_30_sec_watched_actions"]:
-                        video_30_sec_watched += int(v.get("value", 0))
-                except Exception:
-                    pass
-
-            # Calculate metrics
-            cpr = spend / leads if leads > 0 else 0.0
-            hook_rate = (video_30_sec_watched / impressions * 100) if impressions > 0 else 0
-            conversion_rate = (leads / inline_link_clicks * 100) if inline_link_clicks > 0 else 0
-            lp_conversion_rate = (leads / landing_page_views * 100) if landing_page_views > 0 else 0
 
-            return {
-                "leads": leads,
-                "spend": spend,
-                "cpm": cpm,
-                "ctr": ctr,
-                "cpr": cpr,
-                "impressions": impressions,
-                "inline_link_clicks": inline_link_clicks,
-                "video_30_sec_watched": video_30_sec_watched,
-                "hook_rate": hook_rate,
-                "conversion_rate": conversion_rate,
-                "lp_conversion_rate": lp_conversion_rate
-            }
+        if daily:
+            return await _meta_days_from_pages(session, data, lead_action_type, business_id)
+
+        insights = data.get("data", [{}])[0] if data.get("data") else {}
+        return _meta_metrics_from_insights(insights, lead_action_type)
 
     except Exception as e:
-        return {
-            "leads": 0,
-            "spend": 0.0,
-            "cpm": 0.0,
-            "ctr": 0.0,
-            "cpr": 0.0,
-            "impressions": 0,
-            "inline_link_clicks": 0,
-            "video_30_sec_watched": 0,
-            "hook_rate": 0.0,
-            "conversion_rate": 0.0,
-            "lp_conversion_rate": 0.0,
-            "error": str(e)
-        }
+        if daily:
+            return {'days': [], 'error': str(e)}
+        return _empty_meta_metrics(str(e))
+
+
+async def _graph_batch(session, access_token, relative_urls):
+    """
+    Send up to META_BATCH_SIZE GET requests as one Graph batch request.
+    Returns one parsed JSON body per item, or None for items that failed (or the whole batch failing).
+    """
+    batch = [{'method': 'GET', 'relative_url': u} for u in relative_urls]
+    payload = {
+        'access_token': access_token,
+        'batch': json.dumps(batch),
+        'include_headers': 'false'
+    }
+
+    try:
+        async with _limited_request(session, 'POST', f"{META_GRAPH_URL}/", META_BATCH_LIMITER_KEY, data=payload,
+                                    timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
+            if response.status != 200:
+                return [None] * len(relative_urls)
+            items = await response.json()
+    except Exception:
+        return [None] * len(relative_urls)
+
+    bodies = []
+    for item in (items or []):
+        # Items that timed out inside the batch come back as null
+        if not item or item.get('code') != 200:
+            bodies.append(None)
+            continue
+        try:
+            bodies.append(json.loads(item.get('body') or '{}'))
+        except ValueError:
+            bodies.append(None)
+
+    # Pad in case Graph returned fewer items than requested
+    bodies.extend([None] * (len(relative_urls) - len(bodies)))
+    return bodies
+
+
+async def fetch_meta_metrics_batch(session, centers, access_token, date_start, date_stop, daily=False):
+    """
+    Fetch Meta metrics for several ad accounts through Graph batch requests (META_BATCH_SIZE
+    accounts per HTTP call). Results are aligned with centers and have the same shape as
+    fetch_meta_metrics; items the batch could not serve are retried as single calls.
+    """
+    params = _meta_insights_params(access_token, date_start, date_stop, daily=daily)
+    del params['access_token']
+    query = urlencode(params)
+
+    results = [None] * len(centers)
+    # Accounts whose circuit breaker tripped skip the batch: their single call short-circuits (or probes)
+    batchable, fallbacks = [], []
+    for i, center in enumerate(centers):
+        (batchable if circuit_breaker.is_closed(async_runtime.GRAPH_HOST, center['businessId']) else fallbacks).append(i)
+
+    for chunk_start in range(0, len(batchable), META_BATCH_SIZE):
+        chunk = batchable[chunk_start:chunk_start + META_BATCH_SIZE]
+        bodies = await _graph_batch(
+            session, access_token, [f"{centers[i]['businessId']}/insights?{query}" for i in chunk]
+        )
+
+        for i, data in zip(chunk, bodies):
+            center = centers[i]
+            if data is None or 'error' in data:
+                fallbacks.append(i)
+                continue
+            circuit_breaker.get_breaker(async_runtime.GRAPH_HOST, center['businessId']).on_success()
+
+            lead_action_type = _lead_action_type(center)
+            if daily:
+                results[i] = await _meta_days_from_pages(session, data, lead_action_type, center['businessId'])
+            else:
+                insights = data.get("data", [{}])[0] if data.get("data") else {}
+                results[i] = _meta_metrics_from_insights(insights, lead_action_type)
+
+    # Fall back to one request per failed item
+    single_results = await asyncio.gather(*[
+        fetch_meta_metrics(session, centers[i]['businessId'], access_token, date_start, date_stop, centers[i], daily=daily)
+        for i in fallbacks
+    ])
+    for i, result in zip(fallbacks, single_results):
+        results[i] = result
+
+    return results
 
 
 async def get_center_meta_stats(session, center, access_token, start_date_str, end_date_str):
@@ -536,20 +1303,7 @@ async def get_center_meta_stats(session, center, access_token, start_date_str, e
                 'centerName': center['centerName'],
                 'city': center['city'],
                 'businessId': None,
-                'metrics': {
-                    "leads": 0,
-                    "spend": 0.0,
-                    "cpm": 0.0,
-                    "ctr": 0.0,
-                    "cpr": 0.0,
-                    "impressions": 0,
-                    "inline_link_clicks": 0,
-                    "video_30_sec_watched": 0,
-                    "hook_rate": 0.0,
-                    "conversion_rate": 0.0,
-                    "lp_conversion_rate": 0.0,
-                    "error": "No business ID configured"
-                }
+                'metrics': _empty_meta_metrics("No business ID configured")
             }
 
         # Fetch Meta metrics
@@ -574,43 +1328,357 @@ async def get_center_meta_stats(session, center, access_token, start_date_str, e
             'centerName': center['centerName'],
             'city': center['city'],
             'businessId': center.get('businessId'),
-            'metrics': {
-                "leads": 0,
-                "spend": 0.0,
-                "cpm": 0.0,
-                "ctr": 0.0,
-                "cpr": 0.0,
-                "impressions": 0,
-                "inline_link_clicks": 0,
-                "video_30_sec_watched": 0,
-                "hook_rate": 0.0,
-                "conversion_rate": 0.0,
-                "lp_conversion_rate": 0.0,
-                "error": str(e)
-            }
+            'metrics': _empty_meta_metrics(str(e))
         }
 
 
-@st.cache_data(ttl=300)
-def fetch_meta_metrics_for_centers(start_date_str, end_date_str, selected_center_names, access_token):
-    """Fetch Meta Ads metrics for selected centers"""
+async def get_centers_meta_stats(session, centers, access_token, start_date_str, end_date_str, daily=False):
+    """
+    Get Meta Ads statistics for several centers through batched Graph requests.
+    Each result carries 'metrics' (or 'days' with daily=True) like get_center_meta_stats.
+    """
+    with_account = [c for c in centers if c.get('businessId') and c.get('businessId') != 'None']
+
+    try:
+        fetched = await fetch_meta_metrics_batch(
+            session, with_account, access_token, start_date_str, end_date_str, daily=daily
+        )
+    except Exception as e:
+        error = str(e)
+        fetched = [{'days': [], 'error': error} if daily else _empty_meta_metrics(error) for _ in with_account]
+    by_name = {c['centerName']: r for c, r in zip(with_account, fetched)}
+
+    results = []
+    for center in centers:
+        result = {
+            'centerName': center['centerName'],
+            'city': center['city'],
+            'businessId': center['businessId'] if center['centerName'] in by_name else None
+        }
+        data = by_name.get(center['centerName'])
+        if data is None:
+            # Skip centers without businessId
+            error = "No business ID configured"
+            data = {'days': [], 'error': error} if daily else _empty_meta_metrics(error)
+
+        if daily:
+            result.update(data)
+        else:
+            result['metrics'] = data
+        results.append(result)
+
+    return results
+
+
+async def _fetch_meta_span(session, first, last, centers, access_token, keys):
+    """Fetch one span for centers and store the days; returns {centerName: {day: row or None} or error str}"""
+    results = await get_centers_meta_stats(
+        session, centers, access_token, first.isoformat(), last.isoformat(), daily=True
+    )
+
+    fetched = {}
+    for result in results:
+        name = result['centerName']
+        if result.get('error'):
+            fetched[name] = result['error']
+            continue
+
+        # Days without delivery have no insights row; cache them as empty too
+        days = {day: None for day in day_range(first, last)}
+        for row in result.get('days', []):
+            if row.get('date'):
+                days[to_date(row['date'])] = row
+        await _off_loop(day_cache.store, 'meta', keys[name], days)
+        fetched[name] = days
+    return fetched
+
+
+async def _fetch_meta_spans(session, spans, access_token, keys):
+    """
+    Fetch {(first, last): [centers]} spans (centers sharing a span share the Graph batch requests)
+    and store the days in the day cache. Accounts already being fetched for the same span by
+    another session are joined instead of requested again.
+    Returns ({centerName: {day: row or None}}, {centerName: error}).
+    """
+    async def fetch_span(first, last, centers):
+        by_flight = {}
+        for center in centers:
+            by_flight.setdefault(('meta', keys[center['centerName']], first, last), []).append(center)
+
+        async def lead(owned):
+            # One representative center per account/lead mapping is enough
+            fetched = await _fetch_meta_span(
+                session, first, last, [by_flight[k][0] for k in owned], access_token, keys
+            )
+            return {k: fetched.get(by_flight[k][0]['centerName']) for k in owned}
+
+        flights = await single_flight.do_many(list(by_flight), lead)
+        return {c['centerName']: flights[k] for k, cs in by_flight.items() for c in cs}
+
+    span_items = list(spans.items())
+    span_results = await asyncio.gather(*[
+        fetch_span(first, last, centers) for (first, last), centers in span_items
+    ], return_exceptions=True)
+
+    fetched, errors = {}, {}
+    for (_, centers), results in zip(span_items, span_results):
+        if isinstance(results, Exception):
+            errors.update({c['centerName']: str(results) for c in centers})
+            continue
+        for name, days in results.items():
+            if isinstance(days, dict):
+                fetched[name] = days
+            else:
+                errors[name] = days or "No data returned"
+
+    return fetched, errors
+
+
+async def _refresh_meta_spans(spans, access_token, keys):
+    """Background refresh of stale Meta days on the shared runtime; raises when some centers failed"""
+    _, errors = await _fetch_meta_spans(async_runtime.get_session(async_runtime.GRAPH_HOST), spans, access_token, keys)
+    if errors:
+        raise RuntimeError('; '.join(f"{name}: {error}" for name, error in sorted(errors.items())))
+
+
+def _meta_daily_result(center, keys, cached, days, errors):
+    name = center['centerName']
+    result = {
+        'centerName': name,
+        'city': center['city'],
+        'businessId': center['businessId'] if name in keys else None
+    }
+    if name not in keys:
+        result.update({'days': [], 'error': "No business ID configured"})
+    elif name in errors:
+        result.update({'days': [], 'error': errors[name]})
+    else:
+        result['days'] = [cached[name][day] for day in days if cached[name].get(day) is not None]
+    return result
+
+
+def iter_meta_daily_results(selected_centers, access_token, days, freshness=None, deadline=None):
+    """
+    Per-center daily Meta results (get_centers_meta_stats(daily=True) shape) for the given days,
+    yielded as each becomes available: centers served from cache first, then each fetched span as
+    its Graph batch requests complete.
+    Days come from the center x day cache; only each center's missing span is requested, and
+    centers with the same span share the Graph batch requests. Failed centers are not cached.
+    Centers whose only uncached days are stale are served from cache and refreshed in the background.
+    Spans still loading once deadline (a scheduler.Deadline) has passed are yielded as pending errors.
+    """
+    cached = {}
+    keys = {}
+    spans = {}
+    stale_spans = {}
+    for center in selected_centers:
+        business_id = center.get('businessId')
+        if not business_id or business_id == 'None':
+            continue
+
+        # The lead mapping is part of the key: two centers may share an ad account
+        key = (business_id, _lead_action_type(center))
+        hits, missing, stale = day_cache.lookup('meta', key, days, freshness)
+        keys[center['centerName']] = key
+        cached[center['centerName']] = hits
+        if missing:
+            spans.setdefault(missing_span(missing + stale), []).append(center)
+        elif stale:
+            stale_spans.setdefault(missing_span(stale), []).append(center)
+
+    for span, centers in stale_spans.items():
+        refresh_key = ('meta', span, tuple(sorted(repr(keys[c['centerName']]) for c in centers)))
+        refresh = _refresh_in_background(refresh_key, _refresh_meta_spans({span: centers}, access_token, keys))
+        if freshness is not None:
+            freshness.track(refresh)
+
+    fetching = {c['centerName'] for centers in spans.values() for c in centers}
+    for center in selected_centers:
+        if center['centerName'] not in fetching:
+            yield _meta_daily_result(center, keys, cached, days, {})
+
+    jobs = [
+        ((span, centers), lambda session, span=span, centers=centers: _fetch_meta_spans(session, {span: centers}, access_token, keys))
+        for span, centers in spans.items()
+    ]
+    for (span, centers), result in scheduler.as_completed(jobs, host=async_runtime.GRAPH_HOST, deadline=deadline):
+        if isinstance(result, Exception):
+            errors = {c['centerName']: str(result) for c in centers}
+            if isinstance(result, scheduler.DeadlineExceeded):
+                for center in centers:
+                    yield dict(_meta_daily_result(center, keys, cached, days, errors), pending=True)
+                    if freshness is not None:
+                        freshness.pending.add(center['centerName'])
+                continue
+        else:
+            fetched, errors = result
+            for name, fetched_days in fetched.items():
+                cached[name].update(fetched_days)
+            if freshness is not None:
+                freshness.observe(time_module.time())
+
+        for center in centers:
+            yield _meta_daily_result(center, keys, cached, days, errors)
+
+
+def _meta_daily_results(selected_centers, access_token, days, freshness=None, deadline=None):
+    """iter_meta_daily_results collected in selected_centers order"""
+    by_name = {
+        r['centerName']: r
+        for r in iter_meta_daily_results(selected_centers, access_token, days, freshness, deadline)
+    }
+    return [by_name[c['centerName']] for c in selected_centers]
+
+
+def fetch_meta_metrics_for_centers(start_date_str, end_date_str, selected_center_names, access_token, freshness=None,
+                                   latency_budget=None):
+    """
+    Fetch Meta Ads metrics for selected centers, summed from the center x day cache
+    (missing days are fetched with batched Graph requests). Pass a day_cache.Freshness
+    to learn how old the served data is and whether a background refresh was started.
+    """
     from config import CENTERS
 
     selected_centers = [c for c in CENTERS if c['centerName'] in selected_center_names]
+    daily_results = _meta_daily_results(
+        selected_centers, access_token, day_range(start_date_str, end_date_str), freshness,
+        scheduler.deadline(latency_budget)
+    )
+
+    results = []
+    for result in daily_results:
+        days = result.pop('days')
+        if result.get('error'):
+            result['metrics'] = _empty_meta_metrics(result.pop('error'))
+        else:
+            totals = {col: sum(day.get(col, 0) for day in days) for col in META_DAILY_COLUMNS}
+            result['metrics'] = _meta_metrics_from_totals(totals)
+        results.append(result)
 
-    def create_tasks(session):
-        return [
-            get_center_meta_stats(session, center, access_token, start_date_str, end_date_str)
-            for center in selected_centers
-        ]
+    return results
+
+
+def _meta_daily_frame(center_results):
+    """Flatten per-center daily results into the center x day fact table"""
+    rows = []
+    for result in center_results:
+        if not isinstance(result, dict) or result.get('error'):
+            continue
+        for day in result.get('days', []):
+            if not day.get('date'):
+                continue
+            row = {'centerName': result['centerName'], 'date': day['date']}
+            for col in META_DAILY_COLUMNS:
+                row[col] = day.get(col, 0)
+            rows.append(row)
+
+    df = pd.DataFrame(rows, columns=['centerName', 'date'] + META_DAILY_COLUMNS)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def fetch_meta_daily_for_centers(start_date_str, end_date_str, selected_center_names, access_token, freshness=None,
+                                 latency_budget=None):
+    """
+    Fetch the Meta Ads center x day fact table for selected centers. Cached days are reused and
+    only missing days are requested (one paged insights query per center, sent as Graph batch
+    requests). Centers whose request failed, or still loading, have no rows. Expired days are
+    served right away and refreshed in the background; see day_cache.Freshness.
+    """
+    from config import CENTERS
+
+    selected_centers = [c for c in CENTERS if c['centerName'] in selected_center_names]
+    days = day_range(start_date_str, end_date_str)
+    return _meta_daily_frame(_meta_daily_results(
+        selected_centers, access_token, days, freshness, scheduler.deadline(latency_budget)
+    ))
+
+
+def iter_meta_daily_for_centers(start_date_str, end_date_str, selected_center_names, access_token, freshness=None,
+                                latency_budget=None):
+    """
+    fetch_meta_daily_for_centers streamed per center: yields (centerName, fact table rows of that
+    center) as each center's days become available, so pages can draw it without waiting for the others.
+    """
+    from config import CENTERS
+
+    selected_centers = [c for c in CENTERS if c['centerName'] in selected_center_names]
+    days = day_range(start_date_str, end_date_str)
+    deadline = scheduler.deadline(latency_budget)
+    for result in iter_meta_daily_results(selected_centers, access_token, days, freshness, deadline):
+        yield result['centerName'], _meta_daily_frame([result])
+
+
+def _meta_metrics_from_totals(t):
+    """Meta metrics dict from summed additive columns (ratios recomputed from the sums)"""
+    spend = float(t.get('spend', 0.0))
+    leads = int(t.get('leads', 0))
+    impressions = int(t.get('impressions', 0))
+    clicks = float(t.get('clicks', 0.0))
+    inline_link_clicks = int(t.get('inline_link_clicks', 0))
+    landing_page_views = int(t.get('landing_page_views', 0))
+    video_30_sec_watched = int(t.get('video_30_sec_watched', 0))
+
+    return {
+        'leads': leads,
+        'spend': spend,
+        'cpm': spend / impressions * 1000 if impressions > 0 else 0.0,
+        'ctr': clicks / impressions * 100 if impressions > 0 else 0.0,
+        'cpr': spend / leads if leads > 0 else 0.0,
+        'impressions': impressions,
+        'inline_link_clicks': inline_link_clicks,
+        'video_30_sec_watched': video_30_sec_watched,
+        'hook_rate': video_30_sec_watched / impressions * 100 if impressions > 0 else 0.0,
+        'conversion_rate': leads / inline_link_clicks * 100 if inline_link_clicks > 0 else 0.0,
+        'lp_conversion_rate': leads / landing_page_views * 100 if landing_page_views > 0 else 0.0,
+        'landing_page_views': landing_page_views,
+        'clicks': clicks
+    }
+
+
+def rollup_meta_daily(df_daily, buckets, center_names):
+    """
+    Roll the center x day fact table up into buckets ({'bucket_idx', 'label', 'start', 'end'}).
+    Returns one row per center per bucket (zeros where no data) with additive sums and the
+    derived cpr, cpm, ctr, hook_rate, conversion_rate and lp_conversion_rate.
+    """
+    sums = {}
+    if df_daily is not None and not df_daily.empty and buckets:
+        starts = pd.to_datetime([b['start'] for b in buckets]).normalize()
+        ends = pd.to_datetime([b['end'] for b in buckets]).normalize()
+        days = df_daily['date'].dt.normalize()
+        pos = starts.searchsorted(days, side='right') - 1
+        in_bucket = (pos >= 0) & (days.values <= ends.values[pos.clip(min=0)])
+
+        df = df_daily[in_bucket].copy()
+        df['bucket_idx'] = [buckets[p]['bucket_idx'] for p in pos[in_bucket]]
+        grouped = df.groupby(['centerName', 'bucket_idx'])[META_DAILY_COLUMNS].sum()
+        sums = grouped.to_dict('index')
+
+    rows = []
+    for center_name in center_names:
+        for b in buckets:
+            row = {
+                'centerName': center_name,
+                'bucket_idx': b['bucket_idx'],
+                'bucket_label': b['label'],
+                'bucket_start': b['start'],
+                'bucket_end': b['end']
+            }
+            row.update(_meta_metrics_from_totals(sums.get((center_name, b['bucket_idx']), {})))
+            rows.append(row)
 
-    return _execute_async_tasks(create_tasks)
+    return pd.DataFrame(rows)
 
 
-@st.cache_data(ttl=300)
-def fetch_combined_performance_data(start_date_str, end_date_str, selected_center_names, access_token):
-    created_data = fetch_centers_data_created(start_date_str, end_date_str, selected_center_names)
-    meta_data = fetch_meta_metrics_for_centers(start_date_str, end_date_str, selected_center_names, access_token)
+def fetch_combined_performance_data(start_date_str, end_date_str, selected_center_names, access_token, freshness=None,
+                                    latency_budget=None):
+    # One deadline for both halves
+    deadline = scheduler.deadline(latency_budget)
+    created_data = fetch_centers_data_created(start_date_str, end_date_str, selected_center_names, freshness, deadline)
+    meta_data = fetch_meta_metrics_for_centers(
+        start_date_str, end_date_str, selected_center_names, access_token, freshness, deadline
+    )
 
     meta_data_dict = {m['centerName'].strip().lower(): m for m in meta_data}
     combined_results = []
@@ -673,7 +1741,8 @@ def fetch_combined_performance_data(start_date_str, end_date_str, selected_cente
             'has_meta_error': 'error' in meta_metrics,
             'has_created_error': 'error' in created_center,
             'meta_error': meta_metrics.get('error', ''),
-            'created_error': created_center.get('error', '')
+            'created_error': created_center.get('error', ''),
+            'pending': bool(created_center.get('pending') or (meta_center or {}).get('pending'))
         })
 
     return combined_results
@@ -793,124 +1862,135 @@ def get_performance_summary(combined_data):
     return summary
 
 
-async def get_center_rates_kpis(session, center, start_datetime, end_datetime):
-    """Get rates KPIs for a single center from opportunities pipeline"""
-    try:
-        # Fetch pipelines
-        pipeline_url = 'https://rest.gohighlevel.com/v1/pipelines/'
-        headers = {
-            'Authorization': f'Bearer {center["apiKey"]}',
-            'Location-Id': center["locationId"]
-        }
+def _rates_kpis_from_counts(center, counts):
+    """Build the rates KPI dict for a center from its stage code counts"""
+    code = stage_classifier.STAGE_CODE
 
-        async with session.get(pipeline_url, headers=headers, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)) as response:
-            if response.status != 200:
-                return {
-                    'centerName': center['centerName'],
-                    'city': center['city'],
-                    'error': f'Failed to fetch pipelines: {response.status}'
-                }
+    # TOTAL = All opportunities in pipeline (excluding Database Reactivation)
+    totalRDVPlanifies = int(counts.sum() - counts[stage_classifier.EXCLUDED_CODE])
 
-            data = await response.json()
-            pipelines = data.get('pipelines', [])
+    annule = int(counts[code['annule']])
+    confirme = int(counts[code['confirme']])
+    pas_venu = int(counts[code['pas_venu']])
+    present = int(counts[code['present']])
+    concretise = int(counts[code['concretise']])
 
-        # Find target pipeline
-        target_pipeline = next((p for p in pipelines if p['name'] == center['pipelineName']), None)
-        if not target_pipeline:
-            return {
-                'centerName': center['centerName'],
-                'city': center['city'],
-                'error': 'Pipeline not found'
-            }
+    # Calculate counts
+    num_confirmed = confirme + pas_venu + present + concretise
+    num_showed = present + concretise
+    num_cancelled = annule
+    num_concretise = concretise
 
-        # Create stage mapping
-        stage_id_to_name = {stage['id']: stage['name'] for stage in target_pipeline.get('stages', [])}
-
-        # Fetch opportunities
-        opp_url = f"https://rest.gohighlevel.com/v1/pipelines/{target_pipeline['id']}/opportunities"
-        all_opportunities = await fetch_all_opportunities(session, opp_url, center)
-
-        # Filter by date (using createdAt for consistency with rates analysis)
-        opp_filtered_by_date = []
-        for opp in all_opportunities:
-            created_at = opp.get('createdAt')
-            if created_at:
-                try:
-                    opp_datetime = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    if start_datetime <= opp_datetime <= end_datetime:
-                        stage_name = stage_id_to_name.get(opp.get('pipelineStageId', ''), '')
-                        opp_filtered_by_date.append({
-                            **opp,
-                            'stageName': stage_name,
-                            'stageCanonical': canonical(stage_name)
-                        })
-                except (ValueError, AttributeError):
-                    continue
-
-        # TOTAL = All opportunities in pipeline (excluding Database Reactivation)
-        totalRDVPlanifies = sum(1 for o in opp_filtered_by_date if o['stageCanonical'] != EXCLUDED_STAGE_CANON)
-
-        # Filter out Database Reactivation for stage counting
-        opp_filtered = [o for o in opp_filtered_by_date if o['stageCanonical'] != EXCLUDED_STAGE_CANON]
-
-        # Count by canonical stage
-        annule = confirme = pas_venu = present = concretise = 0
-        for o in opp_filtered:
-            stage = o['stageCanonical']
-            if stage == 'annule':
-                annule += 1
-            elif stage == 'confirme':
-                confirme += 1
-            elif stage == 'pas_venu':
-                pas_venu += 1
-            elif stage == 'present':
-                present += 1
-            elif stage == 'concretise':
-                concretise += 1
-
-        # Calculate counts
-        num_confirmed = confirme + pas_venu + present + concretise
-        num_showed = present + concretise
-        num_cancelled = annule
-        num_concretise = concretise
-
-        # Calculate rates
-        confirmation_rate = (num_confirmed / totalRDVPlanifies * 100) if totalRDVPlanifies > 0 else 0.0
-        cancellation_rate = (num_cancelled / totalRDVPlanifies * 100) if totalRDVPlanifies > 0 else 0.0
-        show_up_rate = (num_showed / num_confirmed * 100) if num_confirmed > 0 else 0.0
-        conversion_rate = (num_concretise / num_showed * 100) if num_showed > 0 else 0.0
+    # Calculate rates
+    confirmation_rate = (num_confirmed / totalRDVPlanifies * 100) if totalRDVPlanifies > 0 else 0.0
+    cancellation_rate = (num_cancelled / totalRDVPlanifies * 100) if totalRDVPlanifies > 0 else 0.0
+    show_up_rate = (num_showed / num_confirmed * 100) if num_confirmed > 0 else 0.0
+    conversion_rate = (num_concretise / num_showed * 100) if num_showed > 0 else 0.0
 
-        return {
-            'centerName': center['centerName'],
-            'city': center['city'],
-            'total_rdv': totalRDVPlanifies,
-            'confirmation_rate': round(confirmation_rate, 2),
-            'num_confirmed': num_confirmed,
-            'show_up_rate': round(show_up_rate, 2),
-            'num_showed': num_showed,
-            'cancellation_rate': round(cancellation_rate, 2),
-            'num_cancelled': num_cancelled,
-            'conversion_rate': round(conversion_rate, 2),
-            'num_concretise': num_concretise
-        }
+    return {
+        'centerName': center['centerName'],
+        'city': center['city'],
+        'total_rdv': totalRDVPlanifies,
+        'confirmation_rate': round(confirmation_rate, 2),
+        'num_confirmed': num_confirmed,
+        'show_up_rate': round(show_up_rate, 2),
+        'num_showed': num_showed,
+        'cancellation_rate': round(cancellation_rate, 2),
+        'num_cancelled': num_cancelled,
+        'conversion_rate': round(conversion_rate, 2),
+        'num_concretise': num_concretise
+    }
+
+
+async def get_center_rates_kpis(session, center, start_datetime, end_datetime):
+    """Get rates KPIs for a single center from opportunities pipeline"""
+    results = await get_center_rates_kpis_by_period(session, center, [(start_datetime, end_datetime)])
+    return results[0]
+
+
+async def get_center_rates_kpis_by_period(session, center, period_bounds, freshness=None):
+    """
+    Get rates KPIs for a single center for several periods from ONE opportunities download.
+    period_bounds is a list of non-overlapping whole-day (start_datetime, end_datetime) sorted by start;
+    periods are summed from the center's per-day createdAt counts. Returns one result per period.
+    """
+    if not period_bounds:
+        return []
+
+    try:
+        first_day = period_bounds[0][0].date()
+        days = day_range(first_day, max(end for _, end in period_bounds))
+        _, daily, error = await get_center_daily_counts(session, center, days, freshness)
+        if error:
+            return [error] * len(period_bounds)
+
+        # Bucket by createdAt (for consistency with rates analysis): sum the days of each period
+        created = daily['createdAt']
+        results = []
+        for start, end in period_bounds:
+            first = (start.date() - first_day).days
+            last = (end.date() - first_day).days
+            results.append(_rates_kpis_from_counts(center, created[first:last + 1].sum(axis=0)))
+        return results
 
     except Exception as e:
-        return {
+        return [{
             'centerName': center['centerName'],
             'city': center['city'],
             'error': str(e)
-        }
+        }] * len(period_bounds)
 
 
-@st.cache_data(ttl=300)
-def fetch_rates_kpis_for_centers(start_date_str, end_date_str, selected_center_names):
+def fetch_rates_kpis_for_centers(start_date_str, end_date_str, selected_center_names, freshness=None, latency_budget=None):
     """Fetch rates KPIs for selected centers from opportunities pipeline"""
+    return [
+        view['rates']
+        for view in fetch_center_views(start_date_str, end_date_str, selected_center_names, freshness, latency_budget)
+    ]
+
+
+def iter_rates_kpis_by_period(periods, selected_center_names, freshness=None, latency_budget=None):
+    """
+    Rates KPIs for every (start_date_str, end_date_str) period, yielded center by center as each
+    one completes: (center, results) with results aligned with periods. Periods are assembled from
+    the center x day cache, so each center's opportunities are downloaded at most once per call
+    (and only when some days are missing). All centers run on the shared runtime under the
+    scheduler's concurrency budget; nothing here starts threads.
+    """
     from config import CENTERS
 
-    start_datetime, end_datetime = _prepare_datetime_range(start_date_str, end_date_str)
     selected_centers = [c for c in CENTERS if c['centerName'] in selected_center_names]
+    period_bounds = [_prepare_datetime_range(s, e) for s, e in periods]
+
+    # Periods are summed from per-day counts starting at the earliest one; map results back to the caller's order afterwards
+    order = sorted(range(len(period_bounds)), key=lambda i: period_bounds[i][0])
+    sorted_bounds = [period_bounds[i] for i in order]
+
+    jobs = [
+        (center, lambda session, center=center: get_center_rates_kpis_by_period(session, center, sorted_bounds, freshness))
+        for center in selected_centers
+    ]
+    for center, sorted_results in scheduler.as_completed(jobs, deadline=scheduler.deadline(latency_budget)):
+        if isinstance(sorted_results, Exception):
+            sorted_results = [_error_result(center, sorted_results, freshness)] * len(periods)
+
+        results = [None] * len(periods)
+        for pos, i in enumerate(order):
+            results[i] = sorted_results[pos]
+        yield center, results
+
+
+def fetch_rates_kpis_by_period(periods, selected_center_names, freshness=None, latency_budget=None):
+    """
+    Fetch rates KPIs for selected centers for every (start_date_str, end_date_str) period.
+    Returns a list aligned with periods, each item being the per-center results list
+    (see iter_rates_kpis_by_period to consume centers as they complete).
+    """
+    from config import CENTERS
 
-    def create_tasks(session):
-        return [get_center_rates_kpis(session, center, start_datetime, end_datetime) for center in selected_centers]
-
-    return _execute_async_tasks(create_tasks)
\ No newline at end of file
+    by_center = {
+        center['centerName']: results
+        for center, results in iter_rates_kpis_by_period(periods, selected_center_names, freshness, latency_budget)
+    }
+    names = [c['centerName'] for c in CENTERS if c['centerName'] in by_center]
+    return [[by_center[name][i] for name in names] for i in range(len(periods))]
@@ -0,0 +1,114 @@
+"""
+Process-wide asyncio runtime shared by every Streamlit session
+
+A single event loop runs in a daemon thread and owns one pooled aiohttp session per
+upstream host, so keep-alive connections (DNS, TCP and TLS setup) are reused across
+reruns, pages and users. Synchronous Streamlit code hands coroutines over with submit().
+"""
+import asyncio
+import atexit
+import threading
+
+import aiohttp
+
+# Connection pooling configuration
+CONNECTOR_LIMIT = 100
+CONNECTOR_LIMIT_PER_HOST = 30
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+SESSION_TIMEOUT = aiohttp.ClientTimeout(total=60, connect=10)
+
+HIGHLEVEL_HOST = 'rest.gohighlevel.com'
+GRAPH_HOST = 'graph.facebook.com'
+
+THREAD_NAME = 'async-runtime'
+
+_loop = None
+_thread = None
+_sessions = {}
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the shared event loop, starting its thread on first use"""
+    global _loop, _thread
+
+    with _lock:
+        if _loop is None or _loop.is_closed() or not _thread.is_alive():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=run, name=THREAD_NAME, daemon=True)
+            thread.start()
+            ready.wait()
+
+            _loop, _thread = loop, thread
+            _sessions.clear()
+        return _loop
+
+
+def in_runtime_thread():
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def submit_future(coro):
+    """Schedule a coroutine on the shared loop and return its concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def submit(coro, timeout=None):
+    """Run a coroutine on the shared loop and block the calling (Streamlit) thread for its result"""
+    if in_runtime_thread():
+        coro.close()
+        raise RuntimeError("submit() cannot be called from the runtime loop; await the coroutine instead")
+    return submit_future(coro).result(timeout)
+
+
+def get_session(host):
+    """
+    Pooled session for an upstream host. Must be called from coroutines running on the shared
+    loop; the session is created lazily and reused for the life of the process.
+    """
+    session = _sessions.get(host)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTOR_LIMIT,
+            limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=SESSION_TIMEOUT)
+        _sessions[host] = session
+    return session
+
+
+async def _close_sessions():
+    for session in list(_sessions.values()):
+        if not session.closed:
+            await session.close()
+    _sessions.clear()
+
+
+def shutdown():
+    """Close pooled sessions and stop the loop (registered to run at interpreter exit)"""
+    global _loop
+
+    with _lock:
+        loop = _loop
+        _loop = None
+    if loop is None or loop.is_closed() or not loop.is_running():
+        return
+
+    try:
+        asyncio.run_coroutine_threadsafe(_close_sessions(), loop).result(5)
+    except Exception:
+        pass
+    loop.call_soon_threadsafe(loop.stop)
+
+
+atexit.register(shutdown)
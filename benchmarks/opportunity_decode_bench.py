@@ -0,0 +1,135 @@
+"""
+Benchmark: whole-page json decoding vs field-projected decoding of opportunity pages
+
+Decodes a pipeline's worth of pages and keeps the opportunities, as a sync does, and reports the
+time and the memory still held by the kept items. Pages are read from recorded API responses
+(one JSON body per *.json file) when a directory is given, else synthetic pages shaped like the
+API payload (contact, custom fields, notes) are used.
+
+Run from the repository root:
+    python -m benchmarks.opportunity_decode_bench [recorded_pages_dir | n_pages]
+"""
+import glob
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import opportunity_decode
+from opportunity_store import OPPORTUNITY_FIELDS
+
+PAGE_SIZE = 100
+CHUNK_SIZE = 64 * 1024
+
+
+def make_pages(n_pages, seed=42):
+    rnd = random.Random(seed)
+    pages = []
+    for p in range(n_pages):
+        opportunities = [
+            {
+                'id': f'opp-{p}-{i}',
+                'name': f'Lead {p}-{i}',
+                'monetaryValue': rnd.randint(0, 500),
+                'pipelineId': 'pipeline-1',
+                'pipelineStageId': f'stage-{rnd.randint(0, 9)}',
+                'assignedTo': 'user-1',
+                'status': rnd.choice(['open', 'won', 'lost']),
+                'source': 'Facebook Lead Form',
+                'createdAt': '2025-03-%02dT10:%02d:00.000Z' % (rnd.randint(1, 28), rnd.randint(0, 59)),
+                'updatedAt': '2025-04-%02dT10:%02d:00.000Z' % (rnd.randint(1, 28), rnd.randint(0, 59)),
+                'contact': {
+                    'id': f'contact-{p}-{i}',
+                    'name': 'Prénom Nom',
+                    'email': 'prenom.nom@example.com',
+                    'phone': '+33600000000',
+                    'tags': ['facebook', 'lead', 'épilation'],
+                },
+                'customFields': [{'id': f'field-{k}', 'fieldValue': 'x' * 40} for k in range(6)],
+                'notes': ['Rappeler après 18h'] * 3,
+            }
+            for i in range(PAGE_SIZE)
+        ]
+        meta = {'total': n_pages * PAGE_SIZE, 'nextPageUrl': 'next' if p < n_pages - 1 else None,
+                'startAfterId': opportunities[-1]['id'], 'startAfter': 1700000000000}
+        pages.append(json.dumps({'opportunities': opportunities, 'meta': meta}, ensure_ascii=False).encode())
+    return pages
+
+
+def load_pages(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'rb') as f:
+            pages.append(f.read())
+    return pages
+
+
+def legacy(pages):
+    """Previous path: json.loads each page and keep the whole opportunity dicts"""
+    items = []
+    for body in pages:
+        items.extend(json.loads(body).get('opportunities', []))
+    return items
+
+
+def projected_stdlib(pages):
+    items = []
+    for body in pages:
+        decoder = opportunity_decode.PageDecoder(OPPORTUNITY_FIELDS)
+        for i in range(0, len(body), CHUNK_SIZE):
+            decoder.feed(body[i:i + CHUNK_SIZE])
+        items.extend(decoder.close()[0])
+    return items
+
+
+def projected_orjson(pages):
+    items = []
+    for body in pages:
+        items.extend(opportunity_decode.decode_page(body, OPPORTUNITY_FIELDS)[0])
+    return items
+
+
+def _best_of(fn, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _retained(fn):
+    """Bytes still allocated once fn's result is built (i.e. what a sync keeps)"""
+    tracemalloc.start()
+    result = fn()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def main(source='200'):
+    pages = load_pages(source) if os.path.isdir(source) else make_pages(int(source))
+    payload = sum(len(body) for body in pages)
+
+    candidates = [('streamed stdlib, projected', projected_stdlib)]
+    if opportunity_decode.FAST_JSON:
+        candidates.append(('orjson, projected', projected_orjson))
+
+    t_legacy, r_legacy = _best_of(lambda: legacy(pages))
+    expected = [{field: o.get(field) for field in OPPORTUNITY_FIELDS} for o in r_legacy]
+
+    print(f"{len(pages)} pages, {len(r_legacy):,} opportunities, {payload / 1e6:.1f} MB of JSON")
+    print(f"  {'json.loads, whole dicts':27}: {t_legacy * 1000:8.1f} ms          "
+          f"kept {_retained(lambda: legacy(pages)) / 1e6:7.1f} MB")
+    for label, fn in candidates:
+        elapsed, result = _best_of(lambda: fn(pages))
+        assert result == expected
+        print(f"  {label:27}: {elapsed * 1000:8.1f} ms  ({t_legacy / elapsed:4.1f}x)  "
+              f"kept {_retained(lambda: fn(pages)) / 1e6:7.1f} MB")
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '200')
@@ -0,0 +1,185 @@
+"""
+Byte-bounded two-tier cache: in-memory LRU that spills to a local SQLite file
+
+Entries are sized by their pickled length. When the memory tier goes over its budget the least
+recently used entries move to the disk tier (or are dropped when spill=False, e.g. data that is
+already durable elsewhere); the disk tier evicts its least recently used rows past its own budget.
+A get() that hits disk promotes the entry back to memory. Counters are kept for the status panel.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MEMORY_BUDGET_BYTES = int(float(os.environ.get('CACHE_MEMORY_MB', 256)) * 1024 * 1024)
+DISK_BUDGET_BYTES = int(float(os.environ.get('CACHE_DISK_MB', 1024)) * 1024 * 1024)
+SPILL_PATH = os.environ.get(
+    'CACHE_SPILL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'spill.sqlite3')
+)
+
+MISSING = object()
+
+
+class BoundedCache:
+    """Thread-safe LRU {key: value} bounded in bytes, with a disk spill tier"""
+
+    def __init__(self, memory_budget=MEMORY_BUDGET_BYTES, disk_budget=DISK_BUDGET_BYTES, path=SPILL_PATH):
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+        self.path = path
+        self._memory = OrderedDict()  # key -> (value, size, spill)
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.RLock()
+        self._conn = None
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'spills': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+        }
+
+    # Disk tier
+
+    def _db(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS spill (
+                    key TEXT PRIMARY KEY,
+                    key_blob BLOB NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            self._conn = conn
+            self._disk_bytes = conn.execute('SELECT COALESCE(SUM(size), 0) FROM spill').fetchone()[0]
+        return self._conn
+
+    def _disk_get(self, key):
+        conn = self._db()
+        row = conn.execute('SELECT value FROM spill WHERE key = ?', (repr(key),)).fetchone()
+        if row is None:
+            return MISSING
+        self._disk_delete(key)
+        return pickle.loads(row[0])
+
+    def _disk_put(self, key, blob):
+        conn = self._db()
+        self._disk_delete(key)
+        with conn:
+            conn.execute(
+                'INSERT INTO spill (key, key_blob, value, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                (repr(key), pickle.dumps(key), blob, len(blob), time.time())
+            )
+        self._disk_bytes += len(blob)
+        self.counters['spills'] += 1
+
+        while self._disk_bytes > self.disk_budget:
+            oldest = conn.execute('SELECT key, size FROM spill ORDER BY accessed LIMIT 1').fetchone()
+            if oldest is None:
+                break
+            with conn:
+                conn.execute('DELETE FROM spill WHERE key = ?', (oldest[0],))
+            self._disk_bytes -= oldest[1]
+            self.counters['disk_evictions'] += 1
+
+    def _disk_delete(self, key):
+        conn = self._db()
+        row = conn.execute('SELECT size FROM spill WHERE key = ?', (repr(key),)).fetchone()
+        if row is not None:
+            with conn:
+                conn.execute('DELETE FROM spill WHERE key = ?', (repr(key),))
+            self._disk_bytes -= row[0]
+
+    # Memory tier
+
+    def _evict(self):
+        while self._memory_bytes > self.memory_budget and self._memory:
+            key, (value, size, spill) = self._memory.popitem(last=False)
+            self._memory_bytes -= size
+            self.counters['memory_evictions'] += 1
+            if spill and size <= self.disk_budget:
+                self._disk_put(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def get(self, key, default=None):
+        """Value for key (promoted from disk when spilled), or default"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return entry[0]
+
+            value = self._disk_get(key) if self._disk_bytes != 0 else MISSING
+            if value is MISSING:
+                self.counters['misses'] += 1
+                return default
+
+            self.counters['disk_hits'] += 1
+            self._put(key, value, spill=True)
+            return value
+
+    def _put(self, key, value, spill):
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        self._memory[key] = (value, size, spill)
+        self._memory_bytes += size
+        self._evict()
+
+    def put(self, key, value, spill=True):
+        """Store value; with spill=False it is dropped instead of spilled when evicted"""
+        with self._lock:
+            if self._disk_bytes:
+                self._disk_delete(key)
+            self._put(key, value, spill)
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._memory.pop(key, None)
+            if entry is not None:
+                self._memory_bytes -= entry[1]
+            if self._disk_bytes:
+                self._disk_delete(key)
+
+    def delete_where(self, predicate):
+        """Delete every key (memory and disk) for which predicate(key) is true"""
+        with self._lock:
+            for key in [k for k in self._memory if predicate(k)]:
+                self._memory_bytes -= self._memory.pop(key)[1]
+            if self._disk_bytes:
+                conn = self._db()
+                for (key_blob,) in conn.execute('SELECT key_blob FROM spill').fetchall():
+                    key = pickle.loads(key_blob)
+                    if predicate(key):
+                        self._disk_delete(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            hits = self.counters['memory_hits'] + self.counters['disk_hits']
+            return dict(
+                self.counters,
+                entries=len(self._memory),
+                memory_bytes=self._memory_bytes,
+                memory_budget=self.memory_budget,
+                disk_bytes=self._disk_bytes or 0,
+                disk_budget=self.disk_budget,
+                hit_rate=round(hits / lookups * 100, 1) if lookups else 0.0
+            )
+
+
+# Process-wide instance backing the day cache and the per-center result cache
+cache = BoundedCache()
@@ -0,0 +1,132 @@
+"""
+Background cache warmer for the default dashboard views
+
+main.py opens on the last 30 days, all cities and centers, Weekly view. A daemon thread keeps
+that range warm in the day cache (Meta daily rows for CPR / LP Conversion, opportunity views
+for Rates and the combined performance data) every CACHE_WARM_INTERVAL seconds, refreshing
+entries before they expire so the first paint is a cache hit. Requests go through the usual
+rate limiter and single-flight layers, so the warmer never outpaces user traffic limits.
+Refreshing ahead of expiry runs as background refreshes; each run waits for them (up to the
+interval) so its status reports how many succeeded, failed or were still running.
+"""
+import concurrent.futures
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import api_client
+from day_cache import Freshness
+
+DEFAULT_RANGE_DAYS = 30  # main.py: start = today - 30 days, end = today
+
+logger = logging.getLogger(__name__)
+
+_thread = None
+_lock = threading.Lock()
+_status = {
+    'running': False,
+    'interval': None,
+    'runs': 0,
+    'last_started': None,
+    'last_finished': None,
+    'last_duration': None,
+    'last_error': None,
+    'last_refreshed': None,
+    'next_run': None,
+    'range': None,
+}
+
+
+def default_range():
+    """(start, end) ISO dates of the dashboard's default range"""
+    today = datetime.now().date()
+    return (today - timedelta(days=DEFAULT_RANGE_DAYS)).isoformat(), today.isoformat()
+
+
+def warm_once(interval):
+    """
+    Warm every default view once; entries older than interval are refreshed ahead of expiry.
+    Waits up to interval for the background refreshes started along the way.
+    """
+    from config import CENTERS, ACCESS_TOKEN
+
+    start, end = default_range()
+    names = [c['centerName'] for c in CENTERS]
+
+    _status['last_started'] = time.time()
+    _status['range'] = (start, end)
+    errors = []
+    refreshes = []
+
+    steps = [
+        ('Meta daily (CPR / LP Conversion)',
+         lambda f: api_client.fetch_meta_daily_for_centers(start, end, names, ACCESS_TOKEN, f)),
+        ('Opportunity views (Rates)',
+         lambda f: api_client.fetch_center_views(start, end, names, f)),
+        ('Combined performance',
+         lambda f: api_client.fetch_combined_performance_data(start, end, names, ACCESS_TOKEN, f)),
+    ]
+    for label, step in steps:
+        freshness = Freshness(max_age=interval)
+        try:
+            step(freshness)
+        except Exception as e:
+            logger.warning("Cache warmer step '%s' failed: %s", label, e)
+            errors.append(f"{label}: {e}")
+        refreshes.extend((label, refresh) for refresh in freshness.refreshes)
+
+    # A refresh shared by several steps is counted once
+    labels = {}
+    for label, refresh in refreshes:
+        labels.setdefault(refresh, label)
+    done, running = concurrent.futures.wait(labels, timeout=interval)
+    failed = [f for f in done if f.cancelled() or f.exception()]
+    for refresh in failed:
+        error = 'cancelled' if refresh.cancelled() else refresh.exception()
+        errors.append(f"{labels[refresh]}: refresh failed: {error}")
+    if running:
+        errors.append(f"{len(running)} refreshes still running after {interval}s")
+
+    _status['last_refreshed'] = len(done) - len(failed)
+    _status['runs'] += 1
+    _status['last_finished'] = time.time()
+    _status['last_duration'] = round(_status['last_finished'] - _status['last_started'], 2)
+    _status['last_error'] = '; '.join(errors) or None
+
+
+def _run(interval):
+    while True:
+        try:
+            warm_once(interval)
+        except Exception as e:
+            logger.warning("Cache warmer run failed: %s", e)
+            _status['last_error'] = str(e)
+        _status['next_run'] = time.time() + interval
+        time.sleep(interval)
+
+
+def start(interval=None):
+    """Start the warmer thread once per process (no-op when already running or interval is 0)"""
+    global _thread
+
+    if interval is None:
+        from config import CACHE_WARM_INTERVAL
+        interval = CACHE_WARM_INTERVAL
+    if not interval or interval <= 0:
+        return False
+
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return True
+        _status.update(running=True, interval=interval)
+        _thread = threading.Thread(target=_run, args=(interval,), name='cache-warmer', daemon=True)
+        _thread.start()
+    return True
+
+
+def status():
+    """Snapshot of the warmer state for the status panel"""
+    snapshot = dict(_status)
+    snapshot['running'] = _thread is not None and _thread.is_alive()
+    return snapshot
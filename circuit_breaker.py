@@ -0,0 +1,117 @@
+"""
+Circuit breakers that stop calling an upstream account that keeps failing
+
+A center whose API key was revoked, or whose ad account is disabled, otherwise costs every page
+run a full round of timeouts and errors. A breaker counts consecutive failures per upstream host
+and limiter key. After FAILURE_THRESHOLD of them (auth/account errors, server errors, timeouts)
+it opens: requests fail at once with CircuitOpenError, carrying the last error. After COOLDOWN
+seconds it lets a single probe request through; a success closes it, a failure opens it for
+another cooldown. Throttling is not a failure (the rate limiter deals with it).
+Breakers change state on the shared runtime loop only; tripped() is also called from Streamlit
+threads and returns a best-effort snapshot.
+"""
+import time
+
+FAILURE_THRESHOLD = 3  # consecutive failures that open the breaker
+COOLDOWN = 120         # seconds an open breaker short-circuits before probing
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the breaker of its host/key is open (retry_in None: probing)"""
+
+    def __init__(self, last_error, retry_in=None):
+        status = "probe request in progress" if retry_in is None else f"retrying in {retry_in:.0f}s"
+        super().__init__(f"{last_error} (paused after repeated failures, {status})")
+        self.last_error = last_error
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (cooldown) -> half-open (one probe) -> closed/open"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error = None
+        self.probing = False
+        self.trips = 0
+
+    def retry_in(self):
+        return max(0.0, COOLDOWN - (time.monotonic() - self.opened_at))
+
+    def before_request(self):
+        """Raise CircuitOpenError unless the request may go out (closed, or the half-open probe)"""
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN and not self.retry_in():
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return
+        raise CircuitOpenError(self.last_error, None if self.state == HALF_OPEN else self.retry_in())
+
+    def on_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def on_failure(self, error):
+        self.last_error = error
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= FAILURE_THRESHOLD:
+            if self.state == CLOSED:
+                self.trips += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def on_abandon(self):
+        """The request ended without a verdict (cancelled, throttled): free the probe slot"""
+        self.probing = False
+
+    def snapshot(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'retry_in': round(self.retry_in(), 1) if self.state != CLOSED else 0.0,
+            'trips': self.trips
+        }
+
+
+_breakers = {}
+
+
+def get_breaker(host, key):
+    """The breaker _limited_request consults for host and its limiter key"""
+    breaker = _breakers.get((host, key))
+    if breaker is None:
+        breaker = CircuitBreaker()
+        _breakers[(host, key)] = breaker
+    return breaker
+
+
+def is_closed(host, key):
+    breaker = _breakers.get((host, key))
+    return breaker is None or breaker.state == CLOSED
+
+
+def tripped():
+    """[{'host', 'key', state, last_error, retry_in...}] for every breaker that is not closed"""
+    return [
+        dict(breaker.snapshot(), host=host, key=key)
+        for (host, key), breaker in list(_breakers.items())
+        if breaker.state != CLOSED
+    ]
+
+
+def reset(host=None, key=None):
+    """Close breakers (all of them, or those of a host and/or key)"""
+    for (h, k), breaker in list(_breakers.items()):
+        if (host is None or h == host) and (key is None or k == key):
+            breaker.on_success()
@@ -424,4 +424,56 @@ def create_performance_comparison_table(highlevel_data, meta_data):
 
         return df
 
-    return None
\ No newline at end of file
+    return None
+
+
+# Share of the selected centers that must be in before combined charts and rankings are drawn
+PARTIAL_COMBINED_SHARE = 0.5
+# Seconds a page waits for its data (latency_budget, see scheduler.deadline)
+PAGE_LATENCY_BUDGET = 25
+
+
+def frame_signature(*frames):
+    """Hashable fingerprint of DataFrames (None/empty allowed), to tell whether a redraw is needed"""
+    return tuple(
+        None if df is None else (tuple(df.columns), pd.util.hash_pandas_object(df, index=False).values.tobytes())
+        for df in frames
+    )
+
+
+def pending_caption(center):
+    """Placeholder text of a center cut off by the page's latency budget"""
+    return f"⏳ {center} still loading, refresh to see it"
+
+
+def combined_ready(done, total):
+    """Whether enough centers are in to draw the combined views while the rest still load"""
+    return done >= total or done >= max(1, total * PARTIAL_COMBINED_SHARE)
+
+
+class Placeholders:
+    """
+    Named st.empty() slots filled incrementally as data arrives. A slot is only redrawn when its
+    signature changes, which avoids flicker and duplicate element ids for identical charts.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._shown = {}
+
+    def __contains__(self, name):
+        return name in self._slots
+
+    def add(self, name, container=None):
+        self._slots[name] = (container or st).empty()
+
+    def update(self, name, signature, render):
+        if name in self._shown and self._shown[name] == signature:
+            return
+        self._shown[name] = signature
+        with self._slots[name].container():
+            render()
+
+    def clear(self, name):
+        self._shown.pop(name, None)
+        self._slots[name].empty()
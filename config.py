@@ -3,6 +3,11 @@ import streamlit as st
 # Get access token from Streamlit secrets
 ACCESS_TOKEN = st.secrets["META_ACCESS_TOKEN"]
 
+# Background cache warmer cadence in seconds (0 disables it). Each run refreshes every cached day
+# older than the interval (each refresh syncs a pipeline), so keep it just under the day cache
+# TTL (day_cache.DAY_CACHE_TTL, 300s): shorter intervals only add upstream downloads.
+CACHE_WARM_INTERVAL = int(st.secrets.get("CACHE_WARM_INTERVAL", 270))
+
 # Centers configuration - API keys from Streamlit secrets
 CENTERS = [
        {
@@ -0,0 +1,274 @@
+"""
+Center x day result cache
+
+Results are stored per (family, key, day) - e.g. ('meta', businessId, date) - so any date range
+is answered by combining cached days and only the missing days are fetched. Moving the sidebar
+dates or changing the view type then reuses everything already fetched.
+Families that cannot be split by day are cached per (family, center, params) in ResultCache.
+Nothing is keyed on the selected center set, so toggling centers only fetches the new ones.
+
+Two tiers: days inside a family's hot window keep the short TTL, while days older than its
+horizon are considered closed - they are written to a local SQLite file and never refetched.
+Memory use is bounded by the bounded_cache LRU that holds the values.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import bounded_cache
+from bounded_cache import MISSING
+
+DAY_CACHE_TTL = 300  # seconds until a hot day or per-center result is due for a refresh
+# Expired hot days are still served (and refreshed in the background) up to this age
+STALE_MAX_AGE = 24 * 3600
+
+FROZEN_STORE_PATH = os.environ.get(
+    'DAY_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'frozen_days.sqlite3')
+)
+# Days older than this many days (per family prefix) are frozen; families not listed never are.
+# Meta keeps re-attributing conversions for up to 14 days. Opportunity days never close: a stage
+# change moves the opportunity to today's updatedAt day and changes the stage counted on its
+# createdAt day, however old (they are recounted from the local opportunity store instead).
+FROZEN_AFTER_DAYS = {
+    'meta': 14,
+}
+
+
+def to_date(value):
+    """date from a date, datetime or ISO string"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(value).date()
+
+
+def day_range(start, end):
+    """Every day from start to end (inclusive)"""
+    first, last = to_date(start), to_date(end)
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def missing_span(days):
+    """(first, last) covering the given days, or None when there are none"""
+    if not days:
+        return None
+    return min(days), max(days)
+
+
+class Freshness:
+    """
+    Age of the cached data behind a result: oldest hot day served and whether a refresh is running.
+    max_age (seconds) tightens the TTL for this lookup, e.g. to refresh entries ahead of expiry.
+    pending holds the centers left out because the latency budget ran out (still loading).
+    refreshes holds the futures of the background refreshes started for the result.
+    """
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age
+        self.as_of = None
+        self.refreshing = False
+        self.pending = set()
+        self.refreshes = []
+
+    def observe(self, stored_at):
+        if self.as_of is None or stored_at < self.as_of:
+            self.as_of = stored_at
+
+    def track(self, refresh):
+        """Record a background refresh (concurrent.futures.Future) serving stale data for this result"""
+        self.refreshing = True
+        self.refreshes.append(refresh)
+
+    def to_dict(self):
+        return {'as_of': self.as_of, 'refreshing': self.refreshing, 'pending': sorted(self.pending)}
+
+
+def _utc_today():
+    return datetime.now(timezone.utc).date()
+
+
+class FrozenStore:
+    """Durable {(family, key, day): value} for closed days (SQLite, values pickled)"""
+
+    def __init__(self, path=None):
+        self.path = path or FROZEN_STORE_PATH
+        self._initialized = False
+        self._write_lock = threading.Lock()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS frozen_days (
+                    family TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    value BLOB,
+                    PRIMARY KEY (family, key, day)
+                )
+            """)
+            self._initialized = True
+        return conn
+
+    def load(self, family, key, first, last):
+        """{day: value} of the frozen days stored between first and last"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT day, value FROM frozen_days WHERE family = ? AND key = ? AND day BETWEEN ? AND ?',
+                (family, repr(key), first.isoformat(), last.isoformat())
+            ).fetchall()
+        finally:
+            conn.close()
+        return {date.fromisoformat(day): pickle.loads(value) for day, value in rows}
+
+    def save(self, family, key, values):
+        rows = [(family, repr(key), day.isoformat(), pickle.dumps(value)) for day, value in values.items()]
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany('INSERT OR REPLACE INTO frozen_days (family, key, day, value) VALUES (?, ?, ?, ?)', rows)
+            finally:
+                conn.close()
+
+    def clear(self, family=None, key=None):
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(
+                        'DELETE FROM frozen_days WHERE (? IS NULL OR family = ?) AND (? IS NULL OR key = ?)',
+                        (family, family, None if key is None else repr(key), None if key is None else repr(key))
+                    )
+            finally:
+                conn.close()
+
+
+class DayCache:
+    """
+    Per-(family, key, day) values with two tiers: hot days expire after the TTL, frozen days (past
+    the family's FROZEN_AFTER_DAYS horizon) are kept for good in the FrozenStore. Values live in
+    the byte-bounded bounded_cache LRU (hot days spill to disk, frozen ones are reloaded from the
+    FrozenStore when evicted).
+    """
+
+    def __init__(self, ttl=DAY_CACHE_TTL, frozen_store=None, cache=None):
+        self.ttl = ttl
+        self.frozen_store = frozen_store or FrozenStore()
+        self.cache = cache or bounded_cache.cache
+
+    @staticmethod
+    def frozen_before(family):
+        """First day still in the family's hot window (earlier days are frozen), or None"""
+        horizon = FROZEN_AFTER_DAYS.get(family.split(':')[0])
+        if horizon is None:
+            return None
+        return _utc_today() - timedelta(days=horizon)
+
+    def lookup(self, family, key, days, freshness=None):
+        """
+        Return ({day: value} for cached days, [missing days], [stale days]).
+        Stale days are hot days past the TTL (but younger than STALE_MAX_AGE): they are part of
+        the hits and should be refreshed in the background (stale-while-revalidate).
+        """
+        now = time.time()
+        cutoff = self.frozen_before(family)
+        ttl = self.ttl
+        if freshness is not None and freshness.max_age is not None:
+            ttl = min(ttl, freshness.max_age)
+        hits, missing, stale, cold = {}, [], [], []
+
+        for day in days:
+            if cutoff is not None and day < cutoff:
+                value = self.cache.get(('frozen', family, key, day), MISSING)
+                if value is MISSING:
+                    cold.append(day)
+                else:
+                    hits[day] = value
+                continue
+
+            cached = self.cache.get(('day', family, key, day))
+            if cached is None or now - cached[1] > STALE_MAX_AGE:
+                missing.append(day)
+                continue
+            hits[day] = cached[0]
+            if now - cached[1] > ttl:
+                stale.append(day)
+            if freshness is not None:
+                freshness.observe(cached[1])
+
+        # Frozen days not in memory: read them from disk
+        if cold:
+            loaded = self.frozen_store.load(family, key, min(cold), max(cold))
+            for day, value in loaded.items():
+                self.cache.put(('frozen', family, key, day), value, spill=False)
+            for day in cold:
+                if day in loaded:
+                    hits[day] = loaded[day]
+                else:
+                    missing.append(day)
+
+        return hits, missing, stale
+
+    def store(self, family, key, values):
+        """Store {day: value}; days past the family horizon are frozen (memory + disk)"""
+        now = time.time()
+        cutoff = self.frozen_before(family)
+        frozen = {}
+        for day, value in values.items():
+            if cutoff is not None and day < cutoff:
+                frozen[day] = value
+                self.cache.put(('frozen', family, key, day), value, spill=False)
+            else:
+                self.cache.put(('day', family, key, day), (value, now))
+
+        if frozen:
+            self.frozen_store.save(family, key, frozen)
+
+    def invalidate(self, family=None, key=None, frozen=False):
+        """Drop hot days (and with frozen=True also the frozen tier, on disk included)"""
+        tiers = ('day', 'frozen') if frozen else ('day',)
+        self.cache.delete_where(
+            lambda k: k[0] in tiers and (family is None or k[1] == family) and (key is None or k[2] == key)
+        )
+        if frozen:
+            self.frozen_store.clear(family, key)
+
+
+class ResultCache:
+    """{(family, key, params): value} with a TTL for per-center results, stored in the bounded_cache LRU"""
+
+    def __init__(self, ttl=DAY_CACHE_TTL, cache=None):
+        self.ttl = ttl
+        self.cache = cache or bounded_cache.cache
+
+    def get(self, family, key, params):
+        """Cached value, or None when missing or expired"""
+        cached = self.cache.get(('result', family, key, params))
+        if cached is None or time.time() - cached[1] > self.ttl:
+            return None
+        return cached[0]
+
+    def put(self, family, key, params, value):
+        self.cache.put(('result', family, key, params), (value, time.time()))
+
+    def invalidate(self, family=None, key=None):
+        self.cache.delete_where(
+            lambda k: k[0] == 'result' and (family is None or k[1] == family) and (key is None or k[2] == key)
+        )
+
+
+# Process-wide instances shared by every Streamlit session
+day_cache = DayCache()
+result_cache = ResultCache()
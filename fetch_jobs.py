@@ -0,0 +1,129 @@
+"""
+Cancellable per-session fetch jobs
+
+Each page run registers its upstream work (futures on the shared async runtime) with its
+session's job. When Streamlit reruns the script with different parameters (another page, center
+selection, date range or view), the previous job is cancelled: its tasks stop at their next await
+and single_flight aborts the requests nobody else is waiting for. Whatever the cancelled tasks
+already stored (completed centers and days in the day cache, downloaded opportunity pages) stays
+cached. A rerun with the same parameters keeps the job, so its requests finish and are joined.
+
+While a run waits on upstream work it polls Streamlit for a pending rerun and gives up with
+Superseded, so a filter change takes effect right away instead of after the slowest center.
+"""
+import concurrent.futures
+import threading
+from contextlib import contextmanager
+
+POLL_INTERVAL = 0.25  # seconds between checks for a pending rerun while waiting
+
+SESSION_KEY = '_fetch_job'
+
+_local = threading.local()
+
+
+class Superseded(BaseException):
+    """
+    Raised in the script thread when a rerun is pending and the current run should stop waiting.
+    A BaseException (like asyncio.CancelledError) so generic error handlers do not swallow it.
+    """
+
+
+def _rerun_requested():
+    """Whether Streamlit has a rerun or stop pending for the calling script thread (best effort)"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        try:
+            from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequestType
+        except ImportError:
+            from streamlit.runtime.scriptrunner.script_requests import ScriptRequestType
+    except ImportError:
+        return False
+
+    ctx = get_script_run_ctx(suppress_warning=True)
+    state = getattr(getattr(ctx, 'script_requests', None), '_state', None)
+    return state is not None and state != ScriptRequestType.CONTINUE
+
+
+class FetchJob:
+    """The upstream work of one session for one set of page parameters"""
+
+    def __init__(self, params):
+        self.params = params
+        self.cancelled = False
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def track(self, future):
+        """Attach a concurrent.futures.Future (from async_runtime.submit_future) to the job"""
+        with self._lock:
+            if self.cancelled:
+                future.cancel()
+                return future
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    @property
+    def pending(self):
+        return len(self._futures)
+
+    def cancel(self):
+        """Cancel every unfinished task of the job; returns how many were cancelled"""
+        with self._lock:
+            self.cancelled = True
+            futures, self._futures = self._futures, set()
+        return sum(1 for future in futures if future.cancel())
+
+    def check(self):
+        """Raise Superseded when the job was cancelled or Streamlit has a rerun pending"""
+        if self.cancelled or _rerun_requested():
+            raise Superseded()
+
+    def wait(self, future):
+        """Track future and block for its result, giving up (Superseded) once a rerun is pending"""
+        self.track(future)
+        while True:
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                self.check()
+            except concurrent.futures.CancelledError:
+                self.check()
+                raise
+
+
+def start(session_state, params):
+    """
+    Job for this script run. The session's previous job is kept when params are unchanged and
+    cancelled otherwise.
+    """
+    previous = session_state.get(SESSION_KEY)
+    if previous is not None and not previous.cancelled and previous.params == params:
+        return previous
+    if previous is not None:
+        previous.cancel()
+
+    job = FetchJob(params)
+    session_state[SESSION_KEY] = job
+    return job
+
+
+def current():
+    """Job of the calling script thread, or None (background threads, scripts outside Streamlit)"""
+    return getattr(_local, 'job', None)
+
+
+@contextmanager
+def running(job):
+    """Make job the current job of this thread for the duration of the block"""
+    previous = current()
+    _local.job = job
+    try:
+        yield job
+    finally:
+        _local.job = previous
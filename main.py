@@ -3,6 +3,12 @@ from datetime import datetime, timedelta
 import base64, hmac, hashlib, json
 import logging
 from config import CENTERS, CUSTOM_CSS, ACCESS_TOKEN
+from api_client import META_BATCH_LIMITER_KEY
+import async_runtime
+import bounded_cache
+import cache_warmer
+import circuit_breaker
+import fetch_jobs
 
 # Import only required page modules
 from pages import (
@@ -230,6 +236,9 @@ def logout():
         clear_auth_cookie()
         st.rerun()
 
+# ---------- Keep default views warm (one thread per process) ----------
+cache_warmer.start()
+
 # ---------- Auth first ----------
 check_login()
 
@@ -305,6 +314,49 @@ with st.sidebar:
 
     st.markdown('</div>', unsafe_allow_html=True)
 
+    # --- Cache warmer and cache status ---
+    warmer = cache_warmer.status()
+    with st.expander("🔥 Cache", expanded=False):
+        if not warmer['running']:
+            st.caption("Disabled (CACHE_WARM_INTERVAL = 0)")
+        elif not warmer['last_finished']:
+            st.caption("First run in progress…")
+        else:
+            st.caption(
+                f"Every {warmer['interval']}s · {warmer['runs']} runs · "
+                f"last at {datetime.fromtimestamp(warmer['last_finished']).strftime('%H:%M:%S')} "
+                f"({warmer['last_duration']}s, {warmer['last_refreshed']} refreshes)"
+            )
+            if warmer['range']:
+                st.caption(f"Range: {warmer['range'][0]} → {warmer['range'][1]}")
+            if warmer['next_run']:
+                st.caption(f"Next run: {datetime.fromtimestamp(warmer['next_run']).strftime('%H:%M:%S')}")
+        if warmer['last_error']:
+            st.error(warmer['last_error'])
+
+        cache_stats = bounded_cache.cache.stats()
+        st.caption(
+            f"Cache: {cache_stats['memory_bytes'] / 2**20:.1f} / {cache_stats['memory_budget'] / 2**20:.0f} MB in memory, "
+            f"{cache_stats['disk_bytes'] / 2**20:.1f} MB on disk · hit rate {cache_stats['hit_rate']}% · "
+            f"{cache_stats['memory_evictions']} evictions"
+        )
+
+    # --- Centers whose upstream API keeps failing (circuit breaker open) ---
+    tripped = circuit_breaker.tripped()
+    if tripped:
+        center_names = {c['locationId']: c['centerName'] for c in CENTERS}
+        center_names.update({c['businessId']: c['centerName'] for c in CENTERS if c.get('businessId')})
+        # Graph batch requests share one breaker across ad accounts; it is not a center
+        center_names[META_BATCH_LIMITER_KEY] = "Batch requests, all accounts"
+        with st.expander(f"⚡ Paused centers ({len(tripped)})", expanded=True):
+            for breaker in tripped:
+                source = "Meta" if breaker['host'] == async_runtime.GRAPH_HOST else "HighLevel"
+                retry = f"retry in {breaker['retry_in']:.0f}s" if breaker['state'] == circuit_breaker.OPEN else "probing"
+                st.caption(
+                    f"**{center_names.get(breaker['key'], breaker['key'])}** ({source}) · "
+                    f"{breaker['last_error']} · {retry}"
+                )
+
     # --- Place logout button at the bottom of the sidebar ---
     st.markdown(
         """
@@ -321,17 +373,25 @@ with st.sidebar:
 
 access_token = ACCESS_TOKEN
 
+# Upstream fetches of this run; changing page or filters cancels the previous run's job
+job = fetch_jobs.start(st.session_state, (page, tuple(selected_centers), start_date, end_date, view_type))
+
 if not selected_centers:
     st.warning("Please select at least one center to analyze.")
     st.stop()
 
 # Route to pages
-if page == "CPR Analysis":
-    cpr_analysis.show(selected_centers, start_date, end_date, access_token, view_type=view_type)
-elif page == "LP Conversion Analysis":
-    lp_conversion_analysis.show(selected_centers, start_date, end_date, access_token, view_type=view_type)
-elif page == "Rates Analysis":
-    rates_analysis.show(selected_centers, start_date, end_date, access_token, view_type=view_type)
+try:
+    with fetch_jobs.running(job):
+        if page == "CPR Analysis":
+            cpr_analysis.show(selected_centers, start_date, end_date, access_token, view_type=view_type)
+        elif page == "LP Conversion Analysis":
+            lp_conversion_analysis.show(selected_centers, start_date, end_date, access_token, view_type=view_type)
+        elif page == "Rates Analysis":
+            rates_analysis.show(selected_centers, start_date, end_date, access_token, view_type=view_type)
+except fetch_jobs.Superseded:
+    # A rerun is pending (filters changed); Streamlit starts it as soon as this run ends
+    pass
 
 st.markdown("---")
 st.markdown("© Sbitis Acquisition 2025")
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Columnar representation of a pipeline's opportunities
+
+Only what the metrics use is kept, as NumPy arrays: createdAt/updatedAt as epoch seconds
+(NaN when missing), the stage code (see stage_classifier) and a small status code.
+Date filtering, stage counting and per-day bucketing are vectorized on these arrays.
+"""
+import numpy as np
+
+import stage_classifier
+
+STATUS_CODES = {'open': 0, 'won': 1, 'lost': 2, 'abandoned': 3}
+UNKNOWN_STATUS = -1
+
+# API date field -> batch attribute
+DATE_FIELDS = {'createdAt': 'created', 'updatedAt': 'updated'}
+
+
+class OpportunityBatch:
+    """Opportunities of one pipeline as parallel arrays, with an id -> row index"""
+
+    __slots__ = ('ids', 'created', 'updated', 'stage_code', 'status', '_id_index')
+
+    def __init__(self, ids, created, updated, stage_code, status):
+        self.ids = ids
+        self.created = created
+        self.updated = updated
+        self.stage_code = stage_code
+        self.status = status
+        self._id_index = None
+
+    @classmethod
+    def from_columns(cls, ids, created, updated, stage_ids, statuses, stage_id_to_code):
+        """
+        Build a batch from column sequences; stage ids are mapped to codes once per distinct id.
+        created/updated are epoch seconds (None when missing).
+        """
+        n = len(ids)
+        unique_stage_ids, inverse = np.unique(np.asarray(stage_ids, dtype=object).astype(str), return_inverse=True)
+        stage_lookup = np.array(
+            [stage_id_to_code.get(sid, stage_classifier.UNKNOWN_CODE) for sid in unique_stage_ids],
+            dtype=np.int32
+        )
+
+        return cls(
+            ids=np.asarray(ids, dtype=object),
+            created=np.asarray(created, dtype=np.float64).reshape(n),
+            updated=np.asarray(updated, dtype=np.float64).reshape(n),
+            stage_code=stage_lookup[inverse].reshape(n) if n else np.empty(0, dtype=np.int32),
+            status=np.array([STATUS_CODES.get(s, UNKNOWN_STATUS) for s in statuses], dtype=np.int8).reshape(n),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def id_index(self):
+        """opportunity id -> row, built on first use"""
+        if self._id_index is None:
+            self._id_index = {opp_id: row for row, opp_id in enumerate(self.ids)}
+        return self._id_index
+
+    def dates(self, date_field):
+        return getattr(self, DATE_FIELDS[date_field])
+
+    def window_mask(self, date_field, start_ts, end_ts):
+        """Rows whose date_field lies in [start_ts, end_ts] (missing dates never match)"""
+        values = self.dates(date_field)
+        return (values >= start_ts) & (values <= end_ts)
+
+    def stage_counts(self, date_field, start_ts, end_ts):
+        """Stage code counts of the rows inside the window"""
+        return stage_classifier.count_stages(self.stage_code[self.window_mask(date_field, start_ts, end_ts)])
+
+    def daily_stage_counts(self, date_field, first_day_ts, n_days):
+        """
+        Stage code counts per day for n_days consecutive UTC days starting at first_day_ts.
+        Returns an array of shape (n_days, n stage codes).
+        """
+        width = stage_classifier.n_codes()
+        values = self.dates(date_field)
+
+        with np.errstate(invalid='ignore'):
+            day_idx = np.floor((values - first_day_ts) / 86400)
+        valid = (day_idx >= 0) & (day_idx < n_days)
+
+        flat = day_idx[valid].astype(np.int64) * width + self.stage_code[valid]
+        return np.bincount(flat, minlength=n_days * width).reshape(n_days, width)
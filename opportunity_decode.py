@@ -0,0 +1,143 @@
+"""
+Field-projected decoding of HighLevel opportunity pages
+
+A page carries whole opportunities (contact, custom fields, notes...) while the metrics only read
+a handful of fields (see opportunity_store.OPPORTUNITY_FIELDS). Each opportunity is reduced to
+those fields as soon as it is decoded, so what is kept across pages no longer grows with the
+payload.
+
+Two backends:
+- orjson, when installed: the page body is parsed in one go (C speed) and projected. orjson
+  cannot parse incrementally, so the raw body of the page being decoded is held whole (one page,
+  at most 100 opportunities); what is kept across pages is projected either way.
+- otherwise PageDecoder streams the body: chunks are fed as they arrive and opportunities are
+  decoded one at a time with the stdlib scanner, so the whole page never exists as Python objects.
+"""
+import codecs
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAST_JSON = orjson is not None
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+def project(opportunity, fields):
+    """Keep only fields of an opportunity (missing ones as None); fields=None keeps everything"""
+    if fields is None:
+        return opportunity
+    return {field: opportunity.get(field) for field in fields}
+
+
+def decode_page(body, fields=None):
+    """Decode a whole page body (bytes); returns (projected opportunities, meta)"""
+    if orjson is None:
+        decoder = PageDecoder(fields)
+        decoder.feed(body)
+        return decoder.close()
+    data = orjson.loads(body)
+    return [project(o, fields) for o in data.get('opportunities', [])], data.get('meta') or {}
+
+
+class PageDecoder:
+    """
+    Incremental decoder of one page: feed() the body chunks, then close() for
+    (projected opportunities, meta). Only the undecoded tail of the body is buffered.
+    """
+
+    def __init__(self, fields=None):
+        self.fields = fields
+        self.opportunities = []
+        self.values = {}  # other top-level members (meta, ...)
+        self._text = ''
+        self._pos = 0
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._state = 'start'
+        self._key = None
+
+    def feed(self, chunk):
+        self._text = self._text[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+        self._parse(final=False)
+
+    def close(self):
+        self._text = self._text[self._pos:] + self._utf8.decode(b'', final=True)
+        self._pos = 0
+        self._parse(final=True)
+        if self._state != 'end':
+            raise ValueError('Truncated opportunities page')
+        return self.opportunities, self.values.get('meta') or {}
+
+    def _value(self, final):
+        """Decode the JSON value at the cursor, or None when more data is needed"""
+        try:
+            value, end = _decoder.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # A number (or literal) ending with the buffer may continue in the next chunk
+        if end == len(self._text) and not final:
+            return None
+        self._pos = end
+        return (value,)
+
+    def _parse(self, final):
+        text = self._text
+        while self._state != 'end':
+            self._pos = _WHITESPACE.match(text, self._pos).end()
+            if self._pos == len(text):
+                return
+            char = text[self._pos]
+
+            if self._state == 'start':
+                if char != '{':
+                    raise ValueError('Opportunities page is not a JSON object')
+                self._pos += 1
+                self._state = 'key'
+
+            elif self._state == 'key':
+                if char in ',}':
+                    self._pos += 1
+                    if char == '}':
+                        self._state = 'end'
+                    continue
+                decoded = self._value(final)
+                if decoded is None:
+                    return
+                self._key = decoded[0]
+                self._state = 'colon'
+
+            elif self._state == 'colon':
+                if char != ':':
+                    raise ValueError('Malformed opportunities page')
+                self._pos += 1
+                self._state = 'value'
+
+            elif self._state == 'value':
+                if self._key == 'opportunities' and char == '[':
+                    self._pos += 1
+                    self._state = 'items'
+                    continue
+                decoded = self._value(final)
+                if decoded is None:
+                    return
+                self.values[self._key] = decoded[0]
+                self._state = 'key'
+
+            elif self._state == 'items':
+                if char in ',]':
+                    self._pos += 1
+                    if char == ']':
+                        self._state = 'key'
+                    continue
+                decoded = self._value(final)
+                if decoded is None:
+                    return
+                self.opportunities.append(project(decoded[0], self.fields))
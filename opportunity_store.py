@@ -0,0 +1,203 @@
+"""
+Persistent local store for HighLevel opportunities (SQLite)
+
+Opportunities are keyed by (locationId, opportunity id) and only the fields used by the
+metrics are kept. A sync cursor (latest updatedAt seen) is stored per pipeline so that
+refreshes only need to pull what changed since the previous sync. Whether the API was seen to
+return the pipeline most recently updated first (newest_first, checked on full downloads) is
+stored with it: only then can a refresh stop at the first page holding nothing new.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from opportunity_batch import OpportunityBatch
+
+STORE_PATH = os.environ.get(
+    'OPPORTUNITY_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'opportunities.sqlite3')
+)
+# Full re-download interval: catches deletions and stages moved without an updatedAt bump
+FULL_RESYNC_INTERVAL = 24 * 3600
+
+# Opportunity fields kept in the store (everything else in the API payload is dropped)
+OPPORTUNITY_FIELDS = ('id', 'createdAt', 'updatedAt', 'pipelineStageId', 'status')
+
+# Bumped when the table layout changes; the store is a cache, so older layouts are rebuilt
+SCHEMA_VERSION = 3
+
+_write_lock = threading.Lock()
+_initialized = set()
+
+
+def _connect(path=None):
+    path = path or STORE_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=30)
+    if path not in _initialized:
+        conn.execute('PRAGMA journal_mode=WAL')
+        if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            conn.executescript(f"""
+                DROP TABLE IF EXISTS opportunities;
+                DROP TABLE IF EXISTS sync_state;
+                PRAGMA user_version = {SCHEMA_VERSION};
+            """)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS opportunities (
+                location_id TEXT NOT NULL,
+                pipeline_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                created_at TEXT,
+                updated_at TEXT,
+                created_ts REAL,
+                updated_ts REAL,
+                pipeline_stage_id TEXT,
+                status TEXT,
+                PRIMARY KEY (location_id, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_opportunities_pipeline
+                ON opportunities (location_id, pipeline_id);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                location_id TEXT NOT NULL,
+                pipeline_id TEXT NOT NULL,
+                cursor TEXT,
+                last_sync REAL,
+                last_full_sync REAL,
+                newest_first INTEGER,
+                PRIMARY KEY (location_id, pipeline_id)
+            );
+        """)
+        _initialized.add(path)
+    return conn
+
+
+def _epoch(value):
+    """ISO-8601 timestamp -> epoch seconds (None when missing or unparseable)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_sync_state(location_id, pipeline_id):
+    """Return {'cursor', 'last_sync', 'last_full_sync', 'newest_first'} for a pipeline, or None if never synced"""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            'SELECT cursor, last_sync, last_full_sync, newest_first FROM sync_state '
+            'WHERE location_id = ? AND pipeline_id = ?',
+            (location_id, pipeline_id)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if not row:
+        return None
+    return {'cursor': row[0], 'last_sync': row[1], 'last_full_sync': row[2], 'newest_first': bool(row[3])}
+
+
+def needs_full_sync(state):
+    """True when the pipeline was never synced or the last full download is too old"""
+    return not state or not state.get('last_full_sync') or time.time() - state['last_full_sync'] > FULL_RESYNC_INTERVAL
+
+
+def save_opportunities(location_id, pipeline_id, opportunities, cursor, full_sync=False, newest_first=None):
+    """
+    Upsert opportunities for a pipeline and advance its sync cursor.
+    With full_sync=True the pipeline's rows are replaced (drops deleted opportunities).
+    newest_first records the page order seen on a full download (None keeps the stored one).
+    """
+    rows = [
+        (
+            location_id,
+            pipeline_id,
+            opp.get('id'),
+            opp.get('createdAt'),
+            opp.get('updatedAt'),
+            _epoch(opp.get('createdAt')),
+            _epoch(opp.get('updatedAt')),
+            opp.get('pipelineStageId'),
+            opp.get('status'),
+        )
+        for opp in opportunities
+        if opp.get('id')
+    ]
+    now = time.time()
+
+    with _write_lock:
+        conn = _connect()
+        try:
+            with conn:
+                if full_sync:
+                    conn.execute(
+                        'DELETE FROM opportunities WHERE location_id = ? AND pipeline_id = ?',
+                        (location_id, pipeline_id)
+                    )
+                conn.executemany(
+                    'INSERT OR REPLACE INTO opportunities '
+                    '(location_id, pipeline_id, id, created_at, updated_at, created_ts, updated_ts, '
+                    'pipeline_stage_id, status) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+                conn.execute(
+                    'INSERT INTO sync_state (location_id, pipeline_id, cursor, last_sync, last_full_sync, newest_first) '
+                    'VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (location_id, pipeline_id) DO UPDATE SET '
+                    'cursor = excluded.cursor, last_sync = excluded.last_sync, '
+                    'last_full_sync = COALESCE(excluded.last_full_sync, sync_state.last_full_sync), '
+                    'newest_first = COALESCE(excluded.newest_first, sync_state.newest_first)',
+                    (location_id, pipeline_id, cursor, now, now if full_sync else None, newest_first)
+                )
+        finally:
+            conn.close()
+
+
+def load_batch(location_id, pipeline_id, stage_id_to_code):
+    """
+    Load a pipeline's opportunities as an OpportunityBatch (columnar arrays, no per-row dicts).
+    stage_id_to_code maps pipeline stage ids to stage_classifier codes.
+    """
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            'SELECT id, created_ts, updated_ts, pipeline_stage_id, status FROM opportunities '
+            'WHERE location_id = ? AND pipeline_id = ?',
+            (location_id, pipeline_id)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    columns = list(zip(*rows)) if rows else [()] * 5
+    ids, created, updated, stage_ids, statuses = columns
+    return OpportunityBatch.from_columns(
+        ids,
+        [float('nan') if v is None else v for v in created],
+        [float('nan') if v is None else v for v in updated],
+        stage_ids,
+        statuses,
+        stage_id_to_code
+    )
+
+
+def clear(location_id=None):
+    """Drop stored opportunities and sync state (for one location or everything)"""
+    with _write_lock:
+        conn = _connect()
+        try:
+            with conn:
+                if location_id:
+                    conn.execute('DELETE FROM opportunities WHERE location_id = ?', (location_id,))
+                    conn.execute('DELETE FROM sync_state WHERE location_id = ?', (location_id,))
+                else:
+                    conn.execute('DELETE FROM opportunities')
+                    conn.execute('DELETE FROM sync_state')
+        finally:
+            conn.close()
@@ -16,7 +16,10 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
-from api_client import fetch_meta_metrics_for_centers
+from api_client import iter_meta_daily_for_centers, rollup_meta_daily
+from components import PAGE_LATENCY_BUDGET, Placeholders, combined_ready, frame_signature, pending_caption
+from day_cache import Freshness
+from utils import freshness_caption
 
 PAGE_TITLE = "LP Conversion Analysis"
 VIEW_TYPES = ["Daily", "3 Days", "Weekly", "Two Weeks", "Monthly"]
@@ -110,77 +113,45 @@ def get_buckets_labeled(start_date: date, end_date: date, view_type: str) -> Lis
     return buckets
 
 
-@st.cache_data(ttl=300, show_spinner=False)
-def fetch_and_process_lpconv_data(
-    selected_centers_config: List[Dict],
-    start_date: date,
-    end_date: date,
-    access_token: str,
-    view_type: str
-):
-    """
-    For each bucket, fetch Meta metrics for each center and compute LP Conversion (%).
-    Returns:
-    - df_points: per-center per-bucket rows
-    - df_combined: per-bucket combined weighted LP Conv (sum(leads)/sum(lp_views)*100) only for centers with lp_views > 0
-    - buckets: list of bucket dicts used
-    """
-    buckets = get_buckets_labeled(start_date, end_date, view_type)
-
-    # Valid centers with businessId
+def _valid_center_names(selected_centers_config: List[Dict]) -> List[str]:
+    """Valid centers with businessId"""
     center_names = []
     for c in selected_centers_config:
         cname = c.get('centerName') or c.get('name')
         business_id = c.get('businessId') or c.get('business_id') or c.get('businessID')
         if cname and business_id and str(business_id).lower() != 'none':
             center_names.append(cname)
+    return center_names
+
+
+def _center_points(df_daily: pd.DataFrame | None, buckets: List[Dict], center_names: List[str]) -> pd.DataFrame:
+    """Per-center per-bucket rows (leads, LP views, LP conversion) from the daily fact table"""
+    df_buckets = rollup_meta_daily(df_daily, buckets, center_names)
 
     per_center_rows = []
-    for b in buckets:
-        s_str = b['start'].strftime('%Y-%m-%d')
-        e_str = b['end'].strftime('%Y-%m-%d')
+    for r in df_buckets.to_dict('records'):
+        leads = _safe_int(r['leads'])
+        lp_views = _safe_int(r['landing_page_views'])
+        lp_rate = _safe_float(r['lp_conversion_rate'])
+
+        per_center_rows.append({
+            'centerName': r['centerName'],
+            'bucket_idx': r['bucket_idx'],
+            'bucket_label': r['bucket_label'],
+            'bucket_start': r['bucket_start'],
+            'bucket_end': r['bucket_end'],
+            'leads': leads,
+            'lp_views': lp_views,
+            'lp_conversion': lp_rate  # percent
+        })
 
-        if center_names:
-            results = fetch_meta_metrics_for_centers(s_str, e_str, center_names, access_token)
-        else:
-            results = []
-
-        res_map = {r.get('centerName'): r for r in results} if isinstance(results, list) else {}
-
-        for c in selected_centers_config:
-            center_name = c.get('centerName') or c.get('name')
-            business_id = c.get('businessId') or c.get('business_id') or c.get('businessID')
-            if not center_name or not business_id or str(business_id).lower() == 'none':
-                continue
-
-            r = res_map.get(center_name)
-            if not r or 'metrics' not in r or (isinstance(r['metrics'], dict) and 'error' in r['metrics']):
-                leads = 0
-                lp_rate = 0.0
-                lp_views = 0
-            else:
-                leads = _safe_int(r['metrics'].get('leads', 0))
-                lp_rate = _safe_float(r['metrics'].get('lp_conversion_rate', 0.0))
-                # Approximate lp_views from leads and lp_rate when possible
-                if lp_rate > 0:
-                    lp_views = int(round(leads * 100.0 / lp_rate))
-                else:
-                    lp_views = 0
-
-            per_center_rows.append({
-                'centerName': center_name,
-                'bucket_idx': b['bucket_idx'],
-                'bucket_label': b['label'],
-                'bucket_start': b['start'],
-                'bucket_end': b['end'],
-                'leads': leads,
-                'lp_views': lp_views,
-                'lp_conversion': lp_rate  # percent
-            })
-
-    df = pd.DataFrame(per_center_rows)
+    return pd.DataFrame(per_center_rows)
+
+
+def _combine_points(df: pd.DataFrame):
+    """Order per-center rows and compute the per-bucket combined weighted LP Conv"""
     if df.empty:
-        return df, pd.DataFrame(), buckets
+        return df, pd.DataFrame()
 
     # Combined weighted LP Conv per bucket: sum(leads)/sum(lp_views) * 100
     # Only include centers with lp_views > 0
@@ -197,6 +168,53 @@ def fetch_and_process_lpconv_data(
     df = df.sort_values(['centerName', 'bucket_idx']).reset_index(drop=True)
     agg = agg.sort_values(['bucket_idx']).reset_index(drop=True)
 
+    return df, agg
+
+
+def iter_lpconv_points(
+    center_names: List[str],
+    buckets: List[Dict],
+    start_date: date,
+    end_date: date,
+    access_token: str,
+    freshness: Freshness | None = None,
+    latency_budget: float | None = None
+):
+    """
+    Yield (centerName, per-bucket rows of that center) as each center's daily Meta rows arrive.
+    Daily rows come from the per-center day cache (only missing days are requested).
+    """
+    if not center_names:
+        return
+    s_str = start_date.strftime('%Y-%m-%d')
+    e_str = end_date.strftime('%Y-%m-%d')
+    for name, df_daily in iter_meta_daily_for_centers(
+        s_str, e_str, center_names, access_token, freshness, latency_budget
+    ):
+        yield name, _center_points(df_daily, buckets, [name])
+
+
+def fetch_and_process_lpconv_data(
+    selected_centers_config: List[Dict],
+    start_date: date,
+    end_date: date,
+    access_token: str,
+    view_type: str,
+    freshness: Freshness | None = None
+):
+    """
+    Fetch daily Meta metrics once per center for the whole range, roll them up into buckets and compute LP Conversion (%).
+    Returns:
+    - df_points: per-center per-bucket rows
+    - df_combined: per-bucket combined weighted LP Conv (sum(leads)/sum(lp_views)*100) only for centers with lp_views > 0
+    - buckets: list of bucket dicts used
+    """
+    buckets = get_buckets_labeled(start_date, end_date, view_type)
+    center_names = _valid_center_names(selected_centers_config)
+
+    frames = [df for _, df in iter_lpconv_points(center_names, buckets, start_date, end_date, access_token, freshness)]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    df, agg = _combine_points(df)
     return df, agg, buckets
 
 
@@ -329,42 +347,10 @@ def create_lpconv_chart(center_name: str, df_center: pd.DataFrame, view_type: st
     return fig
 
 
-def show(selected_centers, start_date, end_date, access_token, view_type: str = "Weekly"):
-    """
-    Main entry point called from main.py routing.
-    - view_type now comes from the sidebar (main router) and is not selected on this page.
-    """
-    st.title(PAGE_TITLE)
-
-    from config import CENTERS
-    centers_config = [c for c in CENTERS if c['centerName'] in selected_centers]
-
-    # Sidebar controls provide start_date, end_date, and view_type.
-    filter_start = start_date
-    filter_end = end_date
-
-    # Display-only toggle (kept on page)
-    show_rolling = st.checkbox("7-day rolling (Daily only)", value=False, key="lpconv_rolling_avg")
-
-    if filter_start > filter_end:
-        st.warning("Start date must be before or equal to end date.")
-        return
-
-    buckets_preview = get_buckets_labeled(filter_start, filter_end, view_type)
-    est_calls = len(buckets_preview) * len(centers_config)
-    if est_calls > 160:
-        st.caption(f"Note: This request may trigger ~{est_calls} center-bucket calculations. Caching is enabled.")
-
-    with st.spinner("Fetching and aggregating LP Conversion data..."):
-        df_points, df_combined, buckets = fetch_and_process_lpconv_data(
-            centers_config, filter_start, filter_end, access_token, view_type
-        )
-
+def _render_top_performers(df_points: pd.DataFrame):
     # Rank best performing centers (Top 3 by avg LP Conv)
     top3, all_stats = _rank_best_centers(df_points)
 
-# ...existing code...
-
     st.subheader("🏆 Top LP Conversion Performers")
     if top3.empty:
         st.info("No center performance available for the selected range/view.")
@@ -434,10 +420,8 @@ def show(selected_centers, start_date, end_date, access_token, view_type: str =
                 use_container_width=True
             )
 
-# ...existing code...
-
-    st.markdown("")
 
+def _render_combined(df_combined: pd.DataFrame, view_type: str):
     st.subheader("Overall Performance")
     st.plotly_chart(
         create_combined_chart(df_combined, view_type), 
@@ -451,26 +435,94 @@ def show(selected_centers, start_date, end_date, access_token, view_type: str =
         overall_total_leads = df_combined['leads_sum'].sum()
         st.markdown(f"**Summary (All Centers):** Total Leads: {int(overall_total_leads):,} | Avg LP Conversion: {overall_avg_lpconv:.2f}%")
 
-    st.markdown("")
 
-    if df_points is None or df_points.empty:
-        st.info("No data available for the selected range/view.")
+def _render_center(center: str, df_c: pd.DataFrame, view_type: str, show_rolling: bool):
+    st.plotly_chart(
+        create_lpconv_chart(center, df_c, view_type, show_rolling_avg=show_rolling),
+        use_container_width=True,
+        config={"displayModeBar": False}
+    )
+    # Summary metrics for this center
+    if not df_c.empty:
+        center_total_leads = df_c['leads'].sum()
+        center_avg_lp = df_c['lp_conversion'].mean()
+        st.markdown(f"**{center} Summary:** Leads: {int(center_total_leads):,} | Avg LP Conversion: {center_avg_lp:.2f}%")
+
+
+def show(selected_centers, start_date, end_date, access_token, view_type: str = "Weekly"):
+    """
+    Main entry point called from main.py routing.
+    - view_type now comes from the sidebar (main router) and is not selected on this page.
+    - Sections are placeholders filled as centers arrive: each center's chart is drawn as soon as
+      its data is in, the ranking and combined chart once enough centers are (then refined).
+    """
+    st.title(PAGE_TITLE)
+
+    from config import CENTERS
+    centers_config = [c for c in CENTERS if c['centerName'] in selected_centers]
+
+    # Sidebar controls provide start_date, end_date, and view_type.
+    filter_start = start_date
+    filter_end = end_date
+
+    # Display-only toggle (kept on page)
+    show_rolling = st.checkbox("7-day rolling (Daily only)", value=False, key="lpconv_rolling_avg")
+
+    if filter_start > filter_end:
+        st.warning("Start date must be before or equal to end date.")
         return
 
-    center_list = sorted(df_points['centerName'].unique())
-    st.subheader("By Center")
+    buckets = get_buckets_labeled(filter_start, filter_end, view_type)
+    center_names = _valid_center_names(centers_config)
+    total = len(center_names)
 
+    # Layout first, filled as data arrives
+    slots = Placeholders()
+    slots.add('status')
+    slots.add('top')
+    st.markdown("")
+    slots.add('combined')
+    st.markdown("")
+    slots.add('by_center')
+    if center_names:
+        slots.update('by_center', 'header', lambda: st.subheader("By Center"))
     cols = st.columns(2)
-    for i, center in enumerate(center_list):
-        df_c = df_points[df_points['centerName'] == center].copy()
-        with cols[i % 2]:
-            st.plotly_chart(
-                create_lpconv_chart(center, df_c, view_type, show_rolling_avg=show_rolling),
-                use_container_width=True,
-                config={"displayModeBar": False}
-            )
-            # Summary metrics for this center
-            if not df_c.empty:
-                center_total_leads = df_c['leads'].sum()
-                center_avg_lp = df_c['lp_conversion'].mean()
-                st.markdown(f"**{center} Summary:** Leads: {int(center_total_leads):,} | Avg LP Conversion: {center_avg_lp:.2f}%")
\ No newline at end of file
+    for i, center in enumerate(sorted(center_names)):
+        slots.add(center, cols[i % 2])
+        slots.update(center, None, lambda center=center: st.caption(f"⏳ {center}…"))
+
+    freshness = Freshness()
+    frames = []
+    for center, df_c in iter_lpconv_points(
+        center_names, buckets, filter_start, filter_end, access_token, freshness, PAGE_LATENCY_BUDGET
+    ):
+        frames.append(df_c)
+        done = len(frames)
+        slots.update('status', done, lambda: st.progress(done / total, text=f"Fetching LP Conversion data… {done}/{total} centers"))
+        if center in freshness.pending:
+            slots.update(center, 'pending', lambda: st.caption(pending_caption(center)))
+        else:
+            slots.update(center, frame_signature(df_c), lambda: _render_center(center, df_c, view_type, show_rolling))
+
+        if done < total and combined_ready(done, total):
+            df_points, df_combined = _combine_points(pd.concat(frames, ignore_index=True))
+            slots.update('top', frame_signature(df_points), lambda: _render_top_performers(df_points))
+            slots.update('combined', frame_signature(df_combined), lambda: _render_combined(df_combined, view_type))
+
+    df_points, df_combined = _combine_points(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame())
+
+    caption = freshness_caption(freshness)
+    if caption:
+        slots.update('status', caption, lambda: st.caption(caption))
+    else:
+        slots.clear('status')
+
+    slots.update('top', frame_signature(df_points), lambda: _render_top_performers(df_points))
+    slots.update('combined', frame_signature(df_combined), lambda: _render_combined(df_combined, view_type))
+
+    # Per-center charts; drop the placeholders of centers that returned nothing (pending ones say so)
+    for center in set(center_names) - set(df_points['centerName'] if not df_points.empty else []):
+        if center not in freshness.pending:
+            slots.clear(center)
+    if df_points is None or df_points.empty:
+        slots.update('by_center', 'empty', lambda: st.info("No data available for the selected range/view."))
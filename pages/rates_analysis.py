@@ -1,37 +1,32 @@
 # pages/rates_analysis.py
-# SIMPLIFIED VERSION - Direct API calls with view-based date splitting and parallel batch processing
+# SIMPLIFIED VERSION - Direct API calls with view-based date splitting
 # + Visualization: combined chart and per-center charts with ONLY rate curves
 # + Best performing centers cards
 # FIXED: All Streamlit calls now happen in main thread only
-# ADD: Cleanup of worker threads after data fetching
 # UPDATED: Responsive Plotly charts, legend-based curve toggle/isolate, fullscreen-friendly modebar,
 #    and hover popups with From → To ranges for Weekly, 3 Days, Monthly (works for all views)
 # FIXED: Replaced customdata2 with single combined customdata array
+# UPDATED: One opportunities download per center per run; periods are bucketed locally
+#    (replaces the per-period worker pool)
 
 from __future__ import annotations
 
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Tuple
 import json
 import time
-import concurrent.futures
-import threading
 
 import pandas as pd
 import plotly.graph_objects as go
 
-from api_client import fetch_rates_kpis_for_centers
+from api_client import iter_rates_kpis_by_period
+from components import PAGE_LATENCY_BUDGET, Placeholders, combined_ready, frame_signature, pending_caption
+from day_cache import Freshness
+from utils import freshness_caption
 
 PAGE_TITLE = "Rates Analysis"
 VIEW_TYPES = ["Daily", "3 Days", "Weekly", "Two Weeks", "Monthly"]
 
-# Configuration constants
-MAX_RETRIES = 3
-RETRY_DELAY = 2
-RATE_LIMIT_DELAY = 0.3  # Reduced delay for faster processing
-MAX_WORKERS = 10  # Number of parallel workers
-EXECUTOR_THREAD_PREFIX = "rates-worker"
-
 try:
     import streamlit as st
     STREAMLIT_AVAILABLE = True
@@ -131,94 +126,77 @@ def _month_label(d: date) -> str:
     return datetime(d.year, d.month, 1).strftime("%b %Y")
 
 
-def fetch_with_retry(start_date: date, end_date: date, centers: List[str], label: str) -> Tuple[Dict, List[str]]:
-    """Worker function - NO Streamlit calls here"""
-    errors = []
-    s_str = start_date.strftime('%Y-%m-%d')
-    e_str = end_date.strftime('%Y-%m-%d')
-    
-    for attempt in range(MAX_RETRIES):
-        try:
-            time.sleep(RATE_LIMIT_DELAY)
-            results = fetch_rates_kpis_for_centers(s_str, e_str, centers)
-            return {
-                'period': label,
-                'start_date': s_str,
-                'end_date': e_str,
-                'data': results
-            }, errors
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "Too Many Requests" in error_str:
-                retry_delay = RETRY_DELAY * (2 ** attempt)
-                if attempt < MAX_RETRIES - 1:
-                    errors.append(f"Rate limit hit for {label} (attempt {attempt + 1}/{MAX_RETRIES}). Retrying in {retry_delay}s...")
-                    time.sleep(retry_delay)
-                else:
-                    errors.append(f"Failed to fetch {label} after {MAX_RETRIES} attempts: {error_str}")
-                    return {
-                        'period': label,
-                        'start_date': s_str,
-                        'end_date': e_str,
-                        'data': None,
-                        'error': error_str
-                    }, errors
-            else:
-                errors.append(f"Error fetching {label} (attempt {attempt + 1}/{MAX_RETRIES}): {error_str}")
-                if attempt < MAX_RETRIES - 1:
-                    time.sleep(RETRY_DELAY)
-                else:
-                    return {
-                        'period': label,
-                        'start_date': s_str,
-                        'end_date': e_str,
-                        'data': None,
-                        'error': error_str
-                    }, errors
-
-    return {
-        'period': label,
-        'start_date': s_str,
-        'end_date': e_str,
-        'data': None,
-        'error': 'Unknown error'
-    }, errors
-
-
-def fetch_period_wrapper(args):
-    """Wrapper for parallel execution - NO Streamlit calls"""
-    period_start, period_end, label, centers = args
-    return fetch_with_retry(period_start, period_end, centers, label)
+def _period_results(
+    date_ranges: List[Tuple[str, str]],
+    periods: List[Tuple[date, date, str]],
+    centers: List[str],
+    by_center: Dict[str, List[Dict]],
+    error: str | None = None
+) -> List[Dict]:
+    """One result per period with the data of the centers completed so far (selection order)"""
+    ordered = [name for name in centers if name in by_center]
 
-
-def cleanup_threads(prefix: str = EXECUTOR_THREAD_PREFIX) -> int:
+    results = []
+    for i, ((s_str, e_str), (_, _, label)) in enumerate(zip(date_ranges, periods)):
+        result = {
+            'period': label,
+            'start_date': s_str,
+            'end_date': e_str,
+            'data': [by_center[name][i] for name in ordered] if ordered or not error else None
+        }
+        if error:
+            result['error'] = error
+        results.append(result)
+    return results
+
+
+def fetch_periods(
+    periods: List[Tuple[date, date, str]],
+    centers: List[str],
+    freshness: Freshness | None = None,
+    on_progress: Callable[[int, int, str, List[Dict]], None] | None = None,
+    latency_budget: float | None = None
+) -> Tuple[List[Dict], List[str]]:
     """
-    Best-effort cleanup: mark any lingering worker threads with a given prefix as daemon
-    so they cannot keep the app alive. Returns the number of threads touched.
-    Note: Python cannot forcibly kill threads; using ThreadPoolExecutor within a 'with'
-    block ensures threads should end naturally after work completes.
+    Fetch every period in ONE scheduled fan-out: each center's opportunities are downloaded once
+    and bucketed locally by api_client, whose scheduler and rate limiter bound concurrency and
+    handle throttling/retries. on_progress(done, total, center_name, results_so_far) is called as
+    each center completes. NO Streamlit calls here.
     """
-    touched = 0
-    for t in threading.enumerate():
-        if t is threading.current_thread():
-            continue
-        name = getattr(t, "name", "")
-        if name.startswith(prefix) and not t.daemon:
-            try:
-                t.daemon = True
-                touched += 1
-            except Exception:
-                pass
-    return touched
+    errors = []
+    date_ranges = [(ps.strftime('%Y-%m-%d'), pe.strftime('%Y-%m-%d')) for ps, pe, _ in periods]
+    by_center = {}
+
+    try:
+        for center, center_results in iter_rates_kpis_by_period(date_ranges, centers, freshness, latency_budget):
+            by_center[center['centerName']] = center_results
+            if on_progress:
+                on_progress(
+                    len(by_center), len(centers), center['centerName'],
+                    _period_results(date_ranges, periods, centers, by_center)
+                )
+        error = None
+    except Exception as e:
+        error = str(e)
+        errors.append(f"Error fetching periods: {error}")
+
+    return _period_results(date_ranges, periods, centers, by_center, error), errors
 
 
 def fetch_rates_data(
     selected_centers: List[str],
     start_date: date,
     end_date: date,
-    view_type: str
+    view_type: str,
+    freshness: Freshness | None = None,
+    on_update: Callable[[List[Dict], int, int], None] | None = None,
+    latency_budget: float | None = None
 ) -> Tuple[List[Dict], List[str]]:
-    """Main thread function - Streamlit calls OK here"""
+    """
+    Main thread function - Streamlit calls OK here.
+    on_update(results_so_far, done, total) is called as each center completes (in period order);
+    without it a progress bar is shown.
+    """
     all_errors = []
     if not selected_centers:
         all_errors.append("No centers selected.")
@@ -228,65 +206,24 @@ def fetch_rates_data(
     if not periods:
         all_errors.append("No periods generated from date range.")
         return [], all_errors
-    
-    # Show warning BEFORE starting threads (main thread only)
-    if STREAMLIT_AVAILABLE and len(periods) > 100:
-        st.warning(f"⚠️ Warning: {len(periods)} periods will be fetched. This may take a while but uses parallel processing.")
 
-    # Initialize progress tracking in main thread
-    progress_bar = None
-    status_text = None
-    if STREAMLIT_AVAILABLE:
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        status_text.info(f"⏳ Fetching data for {len(periods)} periods using {MAX_WORKERS} workers...")
+    # One download per center regardless of the number of periods; progress advances per center
+    if on_update is not None:
+        def on_progress(done, total, center_name, results):
+            on_update(_sort_results(results), done, total)
 
-    results = []
-    fetch_args = [(ps, pe, label, selected_centers) for ps, pe, label in periods]
-
-    # Run parallel fetching (workers don't call Streamlit)
-    # IMPORTANT: thread_name_prefix helps us identify threads for cleanup
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=MAX_WORKERS,
-        thread_name_prefix=EXECUTOR_THREAD_PREFIX
-    ) as executor:
-        future_to_label = {executor.submit(fetch_period_wrapper, args): args[2] for args in fetch_args}
-        completed = 0
-        
-        for future in concurrent.futures.as_completed(future_to_label):
-            label = future_to_label[future]
-            try:
-                result, errs = future.result()
-                results.append(result)
-                all_errors.extend(errs)
-            except Exception as e:
-                all_errors.append(f"Critical error processing {label}: {str(e)}")
-                results.append({
-                    'period': label,
-                    'start_date': None,
-                    'end_date': None,
-                    'data': None,
-                    'error': str(e)
-                })
-            
-            # Update progress in main thread only
-            completed += 1
-            if STREAMLIT_AVAILABLE and progress_bar is not None:
-                progress_bar.progress(completed / len(periods))
-                if status_text is not None:
-                    status_text.text(f"Fetching data... ({completed}/{len(periods)}) - {len(all_errors)} errors")
-
-    # After executor exits, threads should be done. Best-effort cleanup:
-    touched = cleanup_threads()
-    if STREAMLIT_AVAILABLE and touched and status_text is not None:
-        status_text.info(f"Cleaned up {touched} worker thread(s).")
-
-    # Clean up progress indicators (main thread)
-    if STREAMLIT_AVAILABLE:
-        if progress_bar is not None:
-            progress_bar.empty()
-        if status_text is not None:
-            status_text.empty()
+        results, errs = fetch_periods(periods, selected_centers, freshness, on_progress, latency_budget)
+    elif STREAMLIT_AVAILABLE:
+        progress = st.progress(0.0, text=f"⏳ Fetching {len(periods)} periods across {len(selected_centers)} centers...")
+
+        def on_progress(done, total, center_name, results):
+            progress.progress(done / total, text=f"⏳ {done}/{total} centers · {center_name} done")
+
+        results, errs = fetch_periods(periods, selected_centers, freshness, on_progress, latency_budget)
+        progress.empty()
+    else:
+        results, errs = fetch_periods(periods, selected_centers, freshness, latency_budget=latency_budget)
+    all_errors.extend(errs)
 
     # Keep period order
     results = _sort_results(results)
@@ -341,7 +278,8 @@ def _results_to_dataframe(periods: List[Dict]) -> pd.DataFrame:
             items = data  # assume list
 
         for item in (items or []):
-            if not isinstance(item, dict):
+            # Pending centers (still loading past the latency budget) have no figures yet
+            if not isinstance(item, dict) or item.get('pending'):
                 continue
 
             center = (
@@ -598,7 +536,17 @@ def show(
         return {"error": f"Invalid view_type. Must be one of {VIEW_TYPES}"}
 
     start_time = time.time()
-    api_results, errors = fetch_rates_data(selected_centers, start_date, end_date, view_type)
+    freshness = Freshness()
+
+    # Draw the layout first and fill it as each center's periods arrive
+    slots = _layout(selected_centers) if STREAMLIT_AVAILABLE else None
+    on_update = None if slots is None else (
+        lambda results, done, total: _update_ui(slots, results, done, total, view_type)
+    )
+
+    api_results, errors = fetch_rates_data(
+        selected_centers, start_date, end_date, view_type, freshness, on_update, PAGE_LATENCY_BUDGET
+    )
     execution_time = round(time.time() - start_time, 2)
 
     result = {
@@ -611,18 +559,56 @@ def show(
         "error_count": len(errors),
         "total_periods": len(api_results),
         "successful_periods": len([r for r in api_results if r.get('data') is not None]),
-        "execution_time_seconds": execution_time
+        "execution_time_seconds": execution_time,
+        "freshness": freshness.to_dict()
     }
 
     if STREAMLIT_AVAILABLE:
-        _display_ui(result)
+        _display_ui(result, slots, freshness)
 
     return result
 
 
-def _display_ui(result: Dict):
+def _layout(centers: List[str]) -> Placeholders:
+    """Title plus one placeholder per section and per center (grid order is final from the start)"""
     st.title("📊 Rates Analysis")
 
+    slots = Placeholders()
+    for name in ('header', 'best', 'combined', 'by_center'):
+        slots.add(name)
+    if centers:
+        slots.update('by_center', 'header', lambda: st.subheader("By Center"))
+    cols = st.columns(2)
+    for i, center in enumerate(sorted(centers)):
+        slots.add(('center', center), cols[i % 2])
+        slots.update(('center', center), None, lambda center=center: st.caption(f"⏳ {center}…"))
+    slots.add('json')
+    return slots
+
+
+def _update_ui(slots: Placeholders, results: List[Dict], done: int, total: int, view_type: str):
+    """Partial render: progress, every completed center, and the combined views once enough centers are in"""
+    slots.update('header', done, lambda: st.progress(
+        done / total, text=f"⏳ {done}/{total} centers · {len(results)} periods"
+    ))
+
+    df = _results_to_dataframe(results)
+    if df.empty:
+        return
+
+    for center in df['centerName'].unique():
+        if ('center', center) not in slots:
+            continue
+        df_c = df[df['centerName'] == center].copy()
+        slots.update(('center', center), frame_signature(df_c), lambda: _render_center(center, df_c, view_type))
+
+    if done < total and combined_ready(done, total):
+        df_combined = _combined_dataframe(df)
+        slots.update('best', frame_signature(df), lambda: _render_best_centers(df))
+        slots.update('combined', frame_signature(df_combined), lambda: _render_combined(df_combined, view_type))
+
+
+def _render_header(result: Dict, df: pd.DataFrame, freshness: Freshness | None = None):
     col1, col2, col3, col4, col5 = st.columns(5)
     with col1:
         st.metric("View", result["view_type"])
@@ -635,6 +621,10 @@ def _display_ui(result: Dict):
     with col5:
         st.metric("Time", f"{result['execution_time_seconds']}s")
 
+    caption = freshness_caption(freshness)
+    if caption:
+        st.caption(caption)
+
     st.info(f"📅 {result['start_date']} → {result['end_date']}")
     st.info(f"🏢 Centers: {', '.join(result['centers'])}")
 
@@ -643,12 +633,6 @@ def _display_ui(result: Dict):
             for error in result["errors"]:
                 st.error(error)
 
-    if result.get("error"):
-        st.error(result["error"])
-        return
-
-    df = _results_to_dataframe(result["periods"])
-    
     if STREAMLIT_AVAILABLE:
         with st.expander("🔍 Debug Info - Data Sample", expanded=False):
             if df.empty:
@@ -672,13 +656,9 @@ def _display_ui(result: Dict):
                     "showed_rate": f"{df['showed_rate'].min():.2f} - {df['showed_rate'].max():.2f}",
                     "concretized_rate": f"{df['concretized_rate'].min():.2f} - {df['concretized_rate'].max():.2f}",
                 })
-    
-    if df.empty:
-        st.warning("No data returned after parsing. Check the debug info above and raw JSON below.")
-        with st.expander("📄 Complete JSON"):
-            st.code(json.dumps(result, indent=2, default=str), language="json")
-        return
 
+
+def _render_best_centers(df: pd.DataFrame):
     best_centers = _get_best_centers(df)
     if best_centers:
         st.subheader("🏆 Best Performing Centers")
@@ -725,11 +705,11 @@ def _display_ui(result: Dict):
         
         st.markdown("")
 
-    df_combined = _combined_dataframe(df)
 
+def _render_combined(df_combined: pd.DataFrame, view_type: str):
     st.subheader("Overall Performance")
     st.plotly_chart(
-        _make_combined_chart(df_combined, result["view_type"]),
+        _make_combined_chart(df_combined, view_type),
         use_container_width=True,
         config={
             "displayModeBar": True,
@@ -756,39 +736,77 @@ def _display_ui(result: Dict):
             f"• **Totals** — Confirmed: {total_confirmed:,}, Showed: {total_showed:,}, Concretized: {total_concretized:,}"
         )
 
-    st.markdown("")
 
-    st.subheader("By Center")
-    centers = sorted(df['centerName'].unique())
-    cols = st.columns(2)
-    for i, center in enumerate(centers):
-        df_c = df[df['centerName'] == center].copy()
-        with cols[i % 2]:
-            st.plotly_chart(
-                _make_center_chart(center, df_c, result["view_type"]),
-                use_container_width=True,
-                config={
-                    "displayModeBar": True,
-                    "displaylogo": False,
-                    "scrollZoom": True,
-                    "responsive": True,
-                    "modeBarButtonsToAdd": ["toImage", "zoom2d", "pan2d", "autoScale2d", "resetScale2d", "select2d", "lasso2d"],
-                    "modeBarButtonsToRemove": [],
-                    "showTips": False
-                }
-            )
-            if not df_c.empty:
-                s_conf = int(df_c['confirmed'].sum())
-                s_show = int(df_c['showed'].sum())
-                s_conc = int(df_c['concretized'].sum())
-                avg_conf = df_c['confirmed_rate'].mean()
-                avg_show = df_c['showed_rate'].mean()
-                avg_conc = df_c['concretized_rate'].mean()
-                st.markdown(
-                    f"**{center}** — Confirmed: {s_conf:,} ({avg_conf:.2f}%) | "
-                    f"Showed: {s_show:,} ({avg_show:.2f}%) | "
-                    f"Concretized: {s_conc:,} ({avg_conc:.2f}%)"
-                )
+def _render_center(center: str, df_c: pd.DataFrame, view_type: str):
+    st.plotly_chart(
+        _make_center_chart(center, df_c, view_type),
+        use_container_width=True,
+        config={
+            "displayModeBar": True,
+            "displaylogo": False,
+            "scrollZoom": True,
+            "responsive": True,
+            "modeBarButtonsToAdd": ["toImage", "zoom2d", "pan2d", "autoScale2d", "resetScale2d", "select2d", "lasso2d"],
+            "modeBarButtonsToRemove": [],
+            "showTips": False
+        }
+    )
+    if not df_c.empty:
+        s_conf = int(df_c['confirmed'].sum())
+        s_show = int(df_c['showed'].sum())
+        s_conc = int(df_c['concretized'].sum())
+        avg_conf = df_c['confirmed_rate'].mean()
+        avg_show = df_c['showed_rate'].mean()
+        avg_conc = df_c['concretized_rate'].mean()
+        st.markdown(
+            f"**{center}** — Confirmed: {s_conf:,} ({avg_conf:.2f}%) | "
+            f"Showed: {s_show:,} ({avg_show:.2f}%) | "
+            f"Concretized: {s_conc:,} ({avg_conc:.2f}%)"
+        )
+
 
+def _render_json(result: Dict):
     with st.expander("📄 Complete JSON"):
-        st.code(json.dumps(result, indent=2, default=str), language="json")
\ No newline at end of file
+        st.code(json.dumps(result, indent=2, default=str), language="json")
+
+
+def _display_ui(result: Dict, slots: Placeholders | None = None, freshness: Freshness | None = None):
+    if slots is None:
+        slots = _layout(result.get("centers") or [])
+
+    if result.get("error"):
+        slots.update('header', 'error', lambda: st.error(result["error"]))
+        return
+
+    df = _results_to_dataframe(result["periods"])
+    slots.update('header', 'final', lambda: _render_header(result, df, freshness))
+
+    centers = set(df['centerName']) if not df.empty else set()
+    pending = freshness.pending if freshness is not None else set()
+    for center in result.get("centers") or []:
+        if center not in centers and ('center', center) in slots:
+            if center in pending:
+                slots.update(('center', center), 'pending', lambda: st.caption(pending_caption(center)))
+            else:
+                slots.clear(('center', center))
+
+    if df.empty:
+        slots.clear('combined')
+        slots.clear('by_center')
+        slots.update('best', 'empty', lambda: st.warning(
+            "No data returned after parsing. Check the debug info above and raw JSON below."
+        ))
+        slots.update('json', 'final', lambda: _render_json(result))
+        return
+
+    df_combined = _combined_dataframe(df)
+    slots.update('best', frame_signature(df), lambda: _render_best_centers(df))
+    slots.update('combined', frame_signature(df_combined), lambda: _render_combined(df_combined, result["view_type"]))
+
+    for center in sorted(centers):
+        if ('center', center) not in slots:
+            continue
+        df_c = df[df['centerName'] == center].copy()
+        slots.update(('center', center), frame_signature(df_c), lambda: _render_center(center, df_c, result["view_type"]))
+
+    slots.update('json', 'final', lambda: _render_json(result))
@@ -0,0 +1,159 @@
+"""
+Adaptive per-host / per-key rate limiting for upstream APIs
+
+Each (host, key) pair - key being a HighLevel locationId or a Meta ad account - gets a token
+bucket. The rate grows additively while requests succeed and is cut multiplicatively when
+the upstream throttles (HTTP 429, Retry-After, Meta usage headers), so requests run at the
+highest sustainable rate instead of relying on fixed sleeps.
+All limiter state lives on the shared async runtime loop, so no locking is needed.
+"""
+import asyncio
+import json
+import time
+from email.utils import parsedate_to_datetime
+
+# Per-host defaults: starting rate, floor and ceiling in requests/second, and burst size
+HOST_LIMITS = {
+    'rest.gohighlevel.com': {'rate': 5.0, 'min_rate': 0.5, 'max_rate': 10.0, 'burst': 10},
+    'graph.facebook.com': {'rate': 5.0, 'min_rate': 0.2, 'max_rate': 20.0, 'burst': 10},
+}
+DEFAULT_LIMITS = {'rate': 5.0, 'min_rate': 0.5, 'max_rate': 10.0, 'burst': 5}
+
+RATE_INCREASE = 0.5       # requests/second added after each successful response
+RATE_DECREASE = 0.5       # multiplier applied when throttled
+DEFAULT_BACKOFF = 5.0     # seconds paused on a 429 without Retry-After
+USAGE_SLOWDOWN_PCT = 75   # Meta usage (% of quota) above which the rate is reduced
+USAGE_PAUSE_PCT = 95      # Meta usage above which requests are paused
+USAGE_PAUSE_SECONDS = 60
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose refill rate adapts to upstream feedback (AIMD)"""
+
+    def __init__(self, rate, min_rate, max_rate, burst):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._lock = None
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Wait for a token (and for any upstream-requested pause to end)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+
+    def on_throttle(self, retry_after=None):
+        self.throttled += 1
+        self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+        self.pause(retry_after if retry_after is not None else DEFAULT_BACKOFF)
+
+    def on_usage(self, usage_pct, regain_seconds=None):
+        """Meta reports how much of the quota is used; slow down before being throttled"""
+        if usage_pct >= USAGE_PAUSE_PCT:
+            self.rate = self.min_rate
+            self.pause(regain_seconds or USAGE_PAUSE_SECONDS)
+        elif usage_pct >= USAGE_SLOWDOWN_PCT:
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE)
+
+    def snapshot(self):
+        return {
+            'rate': round(self.rate, 2),
+            'tokens': round(self.tokens, 2),
+            'paused_for': round(max(0.0, self.paused_until - time.monotonic()), 1),
+            'throttled': self.throttled
+        }
+
+
+_limiters = {}
+
+
+def get_limiter(host, key):
+    """Limiter for an upstream host and API key/account, created on first use"""
+    limiter = _limiters.get((host, key))
+    if limiter is None:
+        limiter = AdaptiveRateLimiter(**HOST_LIMITS.get(host, DEFAULT_LIMITS))
+        _limiters[(host, key)] = limiter
+    return limiter
+
+
+def limiter_stats():
+    return {f"{host}/{key}": limiter.snapshot() for (host, key), limiter in list(_limiters.items())}
+
+
+def parse_retry_after(value):
+    """Retry-After is either delay-seconds or an HTTP date; returns seconds or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_meta_usage(headers):
+    """
+    Highest quota usage (%) reported by Meta's X-App-Usage / X-Ad-Account-Usage /
+    X-Business-Use-Case-Usage headers, plus the seconds until access is regained (if given).
+    """
+    usage = 0.0
+    regain_seconds = None
+
+    def _max_pct(entry):
+        return max(
+            (float(entry.get(k, 0) or 0) for k in ('call_count', 'total_cputime', 'total_time', 'acc_id_util_pct')),
+            default=0.0
+        )
+
+    for header in ('X-App-Usage', 'X-Ad-Account-Usage'):
+        raw = headers.get(header)
+        if raw:
+            try:
+                usage = max(usage, _max_pct(json.loads(raw)))
+            except (ValueError, TypeError, AttributeError):
+                pass
+
+    raw = headers.get('X-Business-Use-Case-Usage')
+    if raw:
+        try:
+            for entries in json.loads(raw).values():
+                for entry in entries:
+                    usage = max(usage, _max_pct(entry))
+                    minutes = entry.get('estimated_time_to_regain_access') or 0
+                    if minutes:
+                        regain_seconds = max(regain_seconds or 0, minutes * 60)
+        except (ValueError, TypeError, AttributeError):
+            pass
+
+    return usage, regain_seconds
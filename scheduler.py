@@ -0,0 +1,173 @@
+"""
+Concurrency budget and fan-out scheduling on the shared async runtime
+
+Every upstream request holds a slot of its host's global budget and of its (host, key) budget
+(key being a locationId or Meta ad account) while it is in flight, so the total number of open
+requests stays bounded however many sessions, pages or periods fan out at once. The rate limiter
+still decides how fast requests start; this decides how many run together.
+
+as_completed() runs a set of jobs on the shared loop and yields their results to the calling
+(Streamlit) thread as each one finishes, so pages can drive st.progress without worker threads.
+Inside a page run the tasks belong to the session's fetch job and are cancelled with it.
+
+A Deadline is the latency budget of a fetch call: waits stop once it has passed and the
+unfinished work is reported as DeadlineExceeded, while it keeps running to fill the caches.
+"""
+import asyncio
+import concurrent.futures
+import time
+
+import async_runtime
+import fetch_jobs
+
+# Requests in flight at once, per upstream host and per (host, API key)
+HOST_CONCURRENCY = {
+    async_runtime.HIGHLEVEL_HOST: 16,
+    async_runtime.GRAPH_HOST: 8,
+}
+DEFAULT_HOST_CONCURRENCY = 8
+KEY_CONCURRENCY = 4
+
+_host_semaphores = {}
+_key_semaphores = {}
+_stats = {'waits': 0}
+
+
+class Budget:
+    """One request's claim on its host and key budgets: acquire() before sending, release() once done"""
+
+    __slots__ = ('host', 'key', '_held')
+
+    def __init__(self, host, key):
+        self.host = host
+        self.key = key
+        self._held = False
+
+    async def acquire(self):
+        host_semaphore = _host_semaphores.get(self.host)
+        if host_semaphore is None:
+            host_semaphore = asyncio.Semaphore(HOST_CONCURRENCY.get(self.host, DEFAULT_HOST_CONCURRENCY))
+            _host_semaphores[self.host] = host_semaphore
+        key_semaphore = _key_semaphores.get((self.host, self.key))
+        if key_semaphore is None:
+            key_semaphore = asyncio.Semaphore(KEY_CONCURRENCY)
+            _key_semaphores[(self.host, self.key)] = key_semaphore
+
+        if key_semaphore.locked() or host_semaphore.locked():
+            _stats['waits'] += 1
+        # Key first, so a busy key never holds host slots other keys could use
+        await key_semaphore.acquire()
+        try:
+            await host_semaphore.acquire()
+        except BaseException:
+            key_semaphore.release()
+            raise
+        self._held = True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            _host_semaphores[self.host].release()
+            _key_semaphores[(self.host, self.key)].release()
+
+
+def budget(host, key):
+    return Budget(host, key)
+
+
+class DeadlineExceeded(Exception):
+    """Result of work still running when its caller's latency budget ran out"""
+
+    def __init__(self):
+        super().__init__("Still loading (latency budget exceeded)")
+
+
+class Deadline:
+    """
+    Point in time a fetch call must answer by, shared by every wait of the call (nested fetches
+    included). Built from a budget in seconds; Deadline(None) never expires.
+    """
+
+    __slots__ = ('at',)
+
+    def __init__(self, budget=None):
+        self.at = None if budget is None else time.monotonic() + budget
+
+    def remaining(self):
+        """Seconds left (None without a deadline)"""
+        return None if self.at is None else max(0.0, self.at - time.monotonic())
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+
+def deadline(latency_budget):
+    """
+    Deadline for a latency budget: seconds, an existing Deadline (shared as-is) or None.
+    This is the latency_budget of api_client's fetch_* / iter_* calls: centers still loading when
+    it runs out come back as pending results (error with 'pending': True, listed in
+    Freshness.pending) and keep loading into the caches for the next call.
+    """
+    return latency_budget if isinstance(latency_budget, Deadline) else Deadline(latency_budget)
+
+
+def as_completed(jobs, host=async_runtime.HIGHLEVEL_HOST, deadline=None):
+    """
+    Run jobs - (tag, factory) pairs where factory(session) returns a coroutine - concurrently on the
+    shared runtime with the pooled session for host. Yields (tag, result) in completion order; a
+    job that raised yields its exception as the result.
+    Once deadline (a Deadline) has passed, every unfinished job yields a DeadlineExceeded and is
+    left running in the background, so its results still reach the caches.
+    Inside a page run the tasks belong to the session's fetch job (see fetch_jobs): waiting stops
+    with Superseded once a rerun is pending, and the tasks are only cancelled if the rerun changes
+    parameters. Outside a job, unfinished tasks are cancelled when the caller stops iterating
+    (unless they were left to the background by the deadline).
+    """
+    async def run(factory):
+        return await factory(async_runtime.get_session(host))
+
+    job = fetch_jobs.current()
+    futures = {async_runtime.submit_future(run(factory)): tag for tag, factory in jobs}
+    if job is not None:
+        for future in futures:
+            job.track(future)
+
+    deadline = deadline or Deadline()
+    pending = set(futures)
+    try:
+        while pending:
+            if deadline.expired():
+                late, pending = pending, set()
+                for future in late:
+                    yield futures[future], DeadlineExceeded()
+                break
+
+            timeout = fetch_jobs.POLL_INTERVAL
+            if deadline.at is not None:
+                timeout = min(timeout, deadline.remaining())
+            done, pending = concurrent.futures.wait(
+                pending, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if job is not None and future.cancelled():
+                    job.check()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = e
+                yield futures[future], result
+            if pending and job is not None:
+                job.check()
+    finally:
+        if job is None:
+            for future in pending:
+                future.cancel()
+
+
+def stats():
+    """Requests in flight per host and how often a request had to wait for a slot"""
+    in_flight = {
+        host: HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY) - semaphore._value
+        for host, semaphore in list(_host_semaphores.items())
+    }
+    return dict(_stats, in_flight=in_flight)
@@ -0,0 +1,131 @@
+"""
+Request coalescing (single-flight) on the shared async runtime
+
+Every Streamlit session runs its upstream calls on the one async_runtime loop, so identical
+concurrent fetches (same center, endpoint and params) can share one in-flight request: the first
+caller leads, later callers await its result. A flight whose callers have all been cancelled
+(e.g. their session changed filters) is cancelled as well, aborting its requests.
+All state is loop-local, so no locking is needed.
+"""
+import asyncio
+
+_inflight = {}  # key -> flight (future of the shared result)
+_work = {}      # flight -> task doing the work
+_waiters = {}   # task -> callers awaiting it (or one of its flights)
+_stats = {'leaders': 0, 'joined': 0, 'abandoned': 0}
+
+
+def _consume_exception(future):
+    # Avoid "exception was never retrieved" when no follower awaited a failed flight
+    if not future.cancelled():
+        future.exception()
+
+
+def _hold(works):
+    for work in works:
+        _waiters[work] = _waiters.get(work, 0) + 1
+
+
+def _release(works):
+    """Drop a caller; work nobody awaits any more (every caller was cancelled) is cancelled too"""
+    for work in works:
+        _waiters[work] -= 1
+        if not _waiters[work]:
+            del _waiters[work]
+            if not work.done():
+                _stats['abandoned'] += 1
+                work.cancel()
+
+
+async def do(key, factory):
+    """
+    Await factory() once per key among concurrent callers. The flight runs as its own task, so a
+    cancelled waiter (even the leader) does not cancel it for the others; it is only cancelled
+    once every caller has gone.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        _stats['leaders'] += 1
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        _work[task] = task
+
+        def done(finished, key=key):
+            if _inflight.get(key) is finished:
+                del _inflight[key]
+            _work.pop(finished, None)
+            _consume_exception(finished)
+
+        task.add_done_callback(done)
+    else:
+        _stats['joined'] += 1
+
+    works = {_work.get(task, task)}
+    _hold(works)
+    try:
+        return await asyncio.shield(task)
+    finally:
+        _release(works)
+
+
+async def do_many(keys, factory):
+    """
+    Coalesce a multi-key fetch (e.g. one Graph batch request for several ad accounts).
+    Keys already in flight are joined; factory(owned_keys) runs for the rest and must return
+    {key: result}. Returns {key: result} for every key.
+    """
+    loop = asyncio.get_running_loop()
+    owned, joined = [], {}
+    for key in dict.fromkeys(keys):
+        flight = _inflight.get(key)
+        if flight is None:
+            owned.append(key)
+        else:
+            joined[key] = flight
+    _stats['leaders'] += len(owned)
+    _stats['joined'] += len(joined)
+
+    runner = None
+    if owned:
+        runner = asyncio.ensure_future(factory(owned))
+        flights = {}
+        for key in owned:
+            flight = loop.create_future()
+            flight.add_done_callback(_consume_exception)
+            _inflight[key] = flights[key] = flight
+            _work[flight] = runner
+
+        def settle(finished, flights=flights):
+            for key, flight in flights.items():
+                if _inflight.get(key) is flight:
+                    del _inflight[key]
+                _work.pop(flight, None)
+                if finished.cancelled():
+                    flight.cancel()
+                elif finished.exception() is not None:
+                    flight.set_exception(finished.exception())
+                else:
+                    flight.set_result(finished.result().get(key))
+
+        runner.add_done_callback(settle)
+
+    works = {_work[flight] for flight in joined.values() if flight in _work}
+    if runner is not None:
+        works.add(runner)
+    _hold(works)
+    try:
+        results = {}
+        if runner is not None:
+            produced = await asyncio.shield(runner)
+            results.update({key: produced.get(key) for key in owned})
+        for key, flight in joined.items():
+            results[key] = await asyncio.shield(flight)
+        return results
+    finally:
+        _release(works)
+
+
+def stats():
+    """Coalescing counters: flights led, calls that joined an in-flight request, flights cancelled
+    because every caller left, flights in progress"""
+    return dict(_stats, inflight=len(_inflight))
@@ -0,0 +1,94 @@
+"""
+Precompiled stage classification with integer stage codes
+
+canonical() normalises accents, runs a regex and up to ~20 substring tests per call, while a
+pipeline only has about ten distinct stage names. Stage names are classified once (memoized)
+into small integer codes so metrics can count stages with numpy.bincount.
+"""
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from utils import canonical, EXCLUDED_STAGE_CANON
+
+# Canonical stages used by the metrics get fixed codes. Any other canonical name (unmapped
+# stages) is interned on first sight so stage stats can still be reported by name.
+STAGE_KEYS = [
+    'annule',
+    'confirme',
+    'pas_venu',
+    'present',
+    'concretise',
+    'non_confirme',
+    'non_qualifie',
+    'sans_reponse',
+    EXCLUDED_STAGE_CANON,
+    '',  # unknown / missing stage
+]
+STAGE_CODE = {name: code for code, name in enumerate(STAGE_KEYS)}
+EXCLUDED_CODE = STAGE_CODE[EXCLUDED_STAGE_CANON]
+UNKNOWN_CODE = STAGE_CODE['']
+
+_names = list(STAGE_KEYS)
+_codes = dict(STAGE_CODE)
+_lock = threading.Lock()
+
+
+def code_for_canonical(canonical_name):
+    """Integer code of a canonical stage name (interned if not seen before)"""
+    code = _codes.get(canonical_name)
+    if code is None:
+        with _lock:
+            code = _codes.get(canonical_name)
+            if code is None:
+                code = len(_names)
+                _names.append(canonical_name)
+                _codes[canonical_name] = code
+    return code
+
+
+@lru_cache(maxsize=4096)
+def stage_code(stage_name):
+    """Memoized raw pipeline stage name -> integer code (same rules as utils.canonical)"""
+    return code_for_canonical(canonical(stage_name or ''))
+
+
+def stage_name(code):
+    """Canonical stage name of a code"""
+    return _names[code]
+
+
+def n_codes():
+    return len(_names)
+
+
+def count_stages(codes, minlength=None):
+    """Count occurrences of each stage code; index the result with STAGE_CODE[...]"""
+    codes = np.asarray(codes, dtype=np.int64)
+    return np.bincount(codes, minlength=max(minlength or 0, n_codes()))
+
+
+def stage_stats(counts):
+    """{canonical stage (or 'unknown'): count} for non-excluded stages with a non-zero count"""
+    stats = {}
+    for code in np.flatnonzero(counts):
+        if code == EXCLUDED_CODE:
+            continue
+        name = stage_name(code) or 'unknown'
+        stats[name] = stats.get(name, 0) + int(counts[code])
+    return stats
+
+
+def counts_to_names(counts):
+    """{canonical stage: count} of the non-zero codes (stable across processes, unlike interned codes)"""
+    return {_names[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+
+def counts_matrix(rows):
+    """Stack {canonical stage: count} rows (see counts_to_names) into a (len(rows), n codes) count array"""
+    entries = [(i, code_for_canonical(name), count) for i, row in enumerate(rows) for name, count in row.items()]
+    matrix = np.zeros((len(rows), n_codes()), dtype=np.int64)
+    for i, code, count in entries:
+        matrix[i, code] = count
+    return matrix
@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Caches and stores go to a scratch directory; set before the app modules read their paths
+_scratch = tempfile.mkdtemp(prefix='analyser-tests-')
+os.environ['OPPORTUNITY_STORE_PATH'] = os.path.join(_scratch, 'opportunities.sqlite3')
+os.environ['DAY_CACHE_PATH'] = os.path.join(_scratch, 'frozen_days.sqlite3')
+os.environ['CACHE_SPILL_PATH'] = os.path.join(_scratch, 'spill.sqlite3')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+import api_client  # noqa: E402
+import async_runtime  # noqa: E402
+import circuit_breaker  # noqa: E402
+import opportunity_store  # noqa: E402
+from day_cache import day_cache, result_cache  # noqa: E402
+from stub_highlevel import StubHighLevel  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    opportunity_store.clear()
+    day_cache.invalidate(frozen=True)
+    result_cache.invalidate()
+    api_client.invalidate_pipeline_cache()
+    circuit_breaker.reset()
+    yield
+
+
+@pytest.fixture
+def run():
+    """run(make_coro) runs make_coro(session) on the shared runtime, as the app does"""
+    def run(make_coro):
+        async def main():
+            return await make_coro(async_runtime.get_session(async_runtime.HIGHLEVEL_HOST))
+        return async_runtime.submit(main(), timeout=60)
+    return run
+
+
+@pytest.fixture
+def highlevel(monkeypatch):
+    """start(opportunities, **options) serves a StubHighLevel and points api_client at it"""
+    servers = []
+
+    def start(opportunities, **options):
+        stub = StubHighLevel(opportunities, **options)
+
+        async def serve():
+            server = TestServer(stub.app())
+            await server.start_server()
+            return server
+
+        server = async_runtime.submit(serve())
+        servers.append(server)
+        monkeypatch.setattr(api_client, 'HIGHLEVEL_API_URL', str(server.make_url('/v1')))
+        return stub
+
+    yield start
+    for server in servers:
+        async_runtime.submit(server.close())
+
+
+@pytest.fixture
+def center():
+    return {
+        'centerName': 'Test Center',
+        'city': 'Paris',
+        'locationId': 'location-1',
+        'apiKey': 'key',
+        'pipelineName': 'Main',
+    }
@@ -0,0 +1,86 @@
+"""
+Local stand-in for the HighLevel v1 API (pipelines, opportunities, appointments)
+
+Serves a pipeline's opportunities 100 per page with the startAfterId/startAfter cursor and
+meta.nextPageUrl of the real API. The page order (order_by), the field the startDate/endDate
+window filters on (window_field) and an error status can be set per test.
+"""
+from datetime import datetime
+
+from aiohttp import web
+
+PIPELINE_ID = 'pipeline-1'
+STAGES = [
+    {'id': 'stage-new', 'name': 'Non confirmé'},
+    {'id': 'stage-confirmed', 'name': 'RDV confirmé'},
+    {'id': 'stage-present', 'name': 'Présent'},
+    {'id': 'stage-won', 'name': 'Concrétisé'},
+    {'id': 'stage-cancelled', 'name': 'Annulé'},
+]
+
+
+def epoch_ms(value):
+    return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp() * 1000)
+
+
+def opportunity(opp_id, created_at, updated_at=None, stage='stage-new'):
+    """An opportunity as the API returns it (with the payload the store does not keep)"""
+    return {
+        'id': opp_id,
+        'name': f'Lead {opp_id}',
+        'monetaryValue': 0,
+        'pipelineId': PIPELINE_ID,
+        'pipelineStageId': stage,
+        'status': 'open',
+        'createdAt': created_at,
+        'updatedAt': updated_at or created_at,
+        'contact': {'id': f'contact-{opp_id}', 'name': 'Prénom Nom', 'tags': ['facebook']},
+        'customFields': [{'id': 'field-1', 'fieldValue': 'x' * 20}],
+    }
+
+
+class StubHighLevel:
+    def __init__(self, opportunities, order_by='updatedAt', window_field='updatedAt'):
+        self.opportunities = {o['id']: o for o in opportunities}
+        self.order_by = order_by
+        self.window_field = window_field
+        self.status = 200
+        self.requests = []
+
+    def update(self, opp_id, updated_at, stage):
+        """Move an opportunity to another stage (the API bumps updatedAt)"""
+        self.opportunities[opp_id].update(updatedAt=updated_at, pipelineStageId=stage)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/v1/pipelines/', self.pipelines)
+        app.router.add_get('/v1/pipelines/{pipeline_id}/opportunities', self.pipeline_opportunities)
+        return app
+
+    async def pipelines(self, request):
+        self.requests.append(request.rel_url)
+        return web.json_response({'pipelines': [{'id': PIPELINE_ID, 'name': 'Main', 'stages': STAGES}]})
+
+    async def pipeline_opportunities(self, request):
+        self.requests.append(request.rel_url)
+        if self.status != 200:
+            return web.json_response({'msg': 'stub error'}, status=self.status)
+
+        query = request.query
+        opps = sorted(self.opportunities.values(), key=lambda o: (o[self.order_by], o['id']), reverse=True)
+        if 'startDate' in query:
+            start, end = int(query['startDate']), int(query['endDate'])
+            opps = [o for o in opps if start <= epoch_ms(o[self.window_field]) <= end]
+        if 'startAfterId' in query:
+            ids = [o['id'] for o in opps]
+            opps = opps[ids.index(query['startAfterId']) + 1:]
+
+        limit = int(query.get('limit', 100))
+        page, rest = opps[:limit], opps[limit:]
+        meta = {
+            'total': len(self.opportunities),
+            'nextPageUrl': 'next' if rest else None,
+            'startAfterId': page[-1]['id'] if page else None,
+            'startAfter': epoch_ms(page[-1][self.order_by]) if page else None,
+        }
+        return web.json_response({'opportunities': page, 'meta': meta})
@@ -0,0 +1,131 @@
+"""Per-center opportunity views assembled from the center x day cache"""
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+
+import api_client
+import circuit_breaker
+from day_cache import Freshness, day_cache, day_range
+from stub_highlevel import opportunity
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+TODAY = NOW.date()
+
+
+def iso(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def views(run, center, first, last, freshness=None):
+    start = datetime.combine(first, time.min, tzinfo=timezone.utc)
+    end = datetime.combine(last, time.max, tzinfo=timezone.utc)
+    return run(lambda session: api_client.get_center_views(session, center, start, end, freshness))
+
+
+def test_failed_download_is_an_error_and_caches_nothing(highlevel, run, center):
+    stub = highlevel([opportunity('opp-1', iso(NOW - timedelta(days=2)))])
+    stub.status = 503
+    first = TODAY - timedelta(days=6)
+
+    result = views(run, center, first, TODAY)
+
+    assert 'HTTP 503' in result['updated']['error']
+    assert 'HTTP 503' in result['created']['error']
+    _, missing, _ = day_cache.lookup('opportunities:createdAt', center['locationId'], day_range(first, TODAY))
+    assert len(missing) == 7
+
+
+def test_open_circuit_breaker_shows_in_the_result(highlevel, run, center):
+    stub = highlevel([opportunity('opp-1', iso(NOW - timedelta(days=2)))])
+    stub.status = 503
+    first = TODAY - timedelta(days=6)
+    for _ in range(circuit_breaker.FAILURE_THRESHOLD):
+        views(run, center, first, TODAY)
+
+    stub.requests.clear()
+    result = views(run, center, first, TODAY)
+
+    assert 'paused after repeated failures' in result['updated']['error']
+    assert not [r for r in stub.requests if r.path.endswith('/opportunities')]
+
+
+def test_stage_change_of_an_old_opportunity_moves_its_counts(highlevel, run, center):
+    created = iso(NOW - timedelta(days=40))
+    stub = highlevel([opportunity('opp-1', created)])
+    first = TODAY - timedelta(days=59)
+
+    before = views(run, center, first, TODAY)
+    assert sum(before['updated']['stageStats'].values()) == 1
+    assert before['rates']['num_showed'] == 0
+
+    stub.update('opp-1', iso(NOW), 'stage-present')
+    day_cache.invalidate()  # the TTL runs out
+    after = views(run, center, first, TODAY)
+
+    # Counted once, on its new updatedAt day; its createdAt day sees the new stage
+    assert sum(after['updated']['stageStats'].values()) == 1
+    assert after['rates']['num_showed'] == 1
+
+
+def test_stale_days_report_their_background_refresh(highlevel, run, center):
+    stub = highlevel([opportunity('opp-1', iso(NOW - timedelta(days=2)))])
+    first = TODAY - timedelta(days=6)
+    views(run, center, first, TODAY)
+
+    # Served from cache while the refresh runs; its failure shows on the tracked future
+    stub.status = 503
+    freshness = Freshness(max_age=0)
+    result = views(run, center, first, TODAY, freshness)
+
+    assert 'error' not in result['updated']
+    assert freshness.refreshing
+    [refresh] = freshness.refreshes
+    with pytest.raises(RuntimeError, match='HTTP 503'):
+        refresh.result(timeout=30)
+
+
+def mixed_opportunities():
+    """Old and recent opportunities, some old ones moved to another stage since"""
+    opps = []
+    for i in range(250):
+        created = NOW - timedelta(days=90 - i * 0.35, hours=i % 5)
+        opps.append(opportunity(f'opp-{i:04d}', iso(created), stage=['stage-new', 'stage-confirmed'][i % 2]))
+    for i, stage in ((3, 'stage-present'), (40, 'stage-won'), (120, 'stage-cancelled'), (200, 'stage-present')):
+        opps[i].update(updatedAt=iso(NOW - timedelta(days=i % 9, hours=1)), pipelineStageId=stage)
+    return opps
+
+
+def wait_for_background_sync():
+    for refresh in list(api_client._refreshes.values()):
+        refresh.result(timeout=30)
+
+
+@pytest.mark.parametrize('days', [1, 7, 30])
+def test_window_search_matches_the_full_sync(highlevel, run, center, monkeypatch, days):
+    stub = highlevel(mixed_opportunities(), window_field='updatedAt')
+    first = TODAY - timedelta(days=days - 1)
+    synced = views(run, center, first, TODAY)
+
+    api_client.opportunity_store.clear()
+    day_cache.invalidate()
+    monkeypatch.setattr(api_client, 'OPPORTUNITY_WINDOW_SEARCH', True)
+    searched = views(run, center, first, TODAY)
+    wait_for_background_sync()
+
+    assert any('startDate' in r.query for r in stub.requests)
+    for view in ('updated', 'created', 'rates'):
+        assert 'error' not in searched[view]
+        assert searched[view] == synced[view]
+
+
+def test_window_search_counts_are_not_cached(highlevel, run, center, monkeypatch):
+    stub = highlevel(mixed_opportunities(), window_field='updatedAt')
+    monkeypatch.setattr(api_client, 'OPPORTUNITY_WINDOW_SEARCH', True)
+    first = TODAY - timedelta(days=6)
+
+    views(run, center, first, TODAY)
+    wait_for_background_sync()
+
+    assert any('startDate' in r.query for r in stub.requests)
+    _, missing, _ = day_cache.lookup('opportunities:updatedAt', center['locationId'], day_range(first, TODAY))
+    assert len(missing) == 7
@@ -0,0 +1,32 @@
+"""Circuit breaker state machine"""
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+def tripped_breaker():
+    breaker = CircuitBreaker()
+    for _ in range(circuit_breaker.FAILURE_THRESHOLD):
+        breaker.before_request()
+        breaker.on_failure("HTTP 503")
+    return breaker
+
+
+def test_open_breaker_counts_down_to_the_probe():
+    breaker = tripped_breaker()
+
+    with pytest.raises(CircuitOpenError, match=r'HTTP 503 \(paused after repeated failures, retrying in \d+s\)'):
+        breaker.before_request()
+
+
+def test_callers_during_the_probe_are_told_it_is_in_progress(monkeypatch):
+    breaker = tripped_breaker()
+    monkeypatch.setattr(circuit_breaker, 'COOLDOWN', 0)
+    breaker.before_request()  # the probe goes out
+
+    with pytest.raises(CircuitOpenError, match='probe request in progress'):
+        breaker.before_request()
+
+    breaker.on_success()
+    breaker.before_request()
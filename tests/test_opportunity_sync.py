@@ -0,0 +1,79 @@
+"""Opportunity store sync against the stub HighLevel API"""
+from datetime import datetime, timedelta, timezone
+
+import api_client
+import opportunity_store
+import stage_classifier
+from stub_highlevel import PIPELINE_ID, opportunity
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def iso(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def created_hourly(n=350):
+    """n opportunities created one per hour over the last weeks, never updated since"""
+    first = NOW - timedelta(hours=n + 1)
+    return [opportunity(f'opp-{i:04d}', iso(first + timedelta(hours=i))) for i in range(n)]
+
+
+def sync(run, center):
+    async def go(session):
+        pipeline, error = await api_client.get_pipeline_metadata(session, center)
+        assert error is None
+        batch, error = await api_client.sync_pipeline_opportunities(session, center, pipeline)
+        assert error is None
+        return batch
+    return run(go)
+
+
+def stage_of(batch, opp_id):
+    return stage_classifier.stage_name(batch.stage_code[batch.id_index[opp_id]])
+
+
+def opportunity_requests(stub):
+    return [r for r in stub.requests if r.path.endswith('/opportunities')]
+
+
+def test_full_sync_keeps_only_the_stored_fields(highlevel, run, center):
+    stub = highlevel(created_hourly())
+    batch = sync(run, center)
+
+    assert len(batch) == 350
+    assert len(opportunity_requests(stub)) == 4
+    state = opportunity_store.get_sync_state(center['locationId'], PIPELINE_ID)
+    assert state['cursor'] == stub.opportunities['opp-0349']['updatedAt']
+
+
+def test_incremental_sync_stops_early_when_pages_are_newest_first(highlevel, run, center):
+    opps = created_hourly()
+    # An old opportunity updated since: updatedAt order differs from creation order
+    opps[10]['updatedAt'] = iso(NOW - timedelta(minutes=30))
+    stub = highlevel(opps, order_by='updatedAt')
+    sync(run, center)
+    assert opportunity_store.get_sync_state(center['locationId'], PIPELINE_ID)['newest_first']
+
+    stub.update('opp-0020', iso(NOW), 'stage-present')
+    stub.requests.clear()
+    batch = sync(run, center)
+
+    assert stage_of(batch, 'opp-0020') == 'present'
+    # The first page holds the update, the second nothing newer than the cursor
+    assert len(opportunity_requests(stub)) == 2
+
+
+def test_incremental_sync_reads_every_page_when_not_newest_first(highlevel, run, center):
+    stub = highlevel(created_hourly(), order_by='createdAt')
+    sync(run, center)
+    assert not opportunity_store.get_sync_state(center['locationId'], PIPELINE_ID)['newest_first']
+
+    # Stays on the last page in creation order: an early stop would miss it
+    stub.update('opp-0020', iso(NOW), 'stage-present')
+    stub.requests.clear()
+    batch = sync(run, center)
+
+    assert stage_of(batch, 'opp-0020') == 'present'
+    assert len(opportunity_requests(stub)) == 4
+    assert len(batch) == 350
@@ -3,6 +3,7 @@ Utility functions for data processing and formatting
 """
 import unicodedata
 import re
+from datetime import datetime
 from config import BENCHMARKS, COLORS
 
 def strip_accents(s=""):
@@ -176,6 +177,24 @@ def create_metric_card(title, value, metric_type, delta=None, small=False):
     </div>
     """
 
+def freshness_caption(freshness):
+    """
+    'Data as of hh:mm, refreshing… · n centers still loading' caption for a day_cache.Freshness
+    (empty when nothing is cached and nothing is pending)
+    """
+    if freshness is None:
+        return ""
+    parts = []
+    if freshness.as_of is not None:
+        caption = f"🕒 Data as of {datetime.fromtimestamp(freshness.as_of).strftime('%H:%M')}"
+        if freshness.refreshing:
+            caption += ", refreshing…"
+        parts.append(caption)
+    if freshness.pending:
+        n = len(freshness.pending)
+        parts.append(f"⏳ {n} center{'s' if n > 1 else ''} still loading, refresh to see {'them' if n > 1 else 'it'}")
+    return " · ".join(parts)
+
 def pct(v, d):
     """Calculate percentage"""
     return (v/d)*100 if d else 0